@@ -139,6 +139,18 @@ class afsbase(object):
     def list_dir(self, dirpath):
         pass
 
+    # list directory entries (files and sub-directories)
+    # and return stats (afsstat) of found items
+    def list_dir_stat(self, dirpath):
+        stats = []
+        entries = self.list_dir(dirpath)
+        if entries:
+            for entry in entries:
+                sb = self.stat(dirpath.rstrip("/") + "/" + entry)
+                if sb:
+                    stats.append(sb)
+        return stats
+
     # check if given path is a directory and return True/False
     @abstractmethod
     def is_dir(self, dirpath):
@@ -155,11 +167,53 @@ class afsbase(object):
     def read(self, filepath, offset, size):
         pass
 
+    # read bytes at given offset from given path into a writable buffer
+    # (bytearray or memoryview) and return the number of bytes read
+    def readinto(self, filepath, offset, buf):
+        data = self.read(filepath, offset, len(buf))
+        if not data:
+            return 0
+
+        size = min(len(data), len(buf))
+        memoryview(buf)[:size] = data[:size]
+        return size
+
+    # check if readinto reads into the buffer without an extra copy,
+    # otherwise read is as cheap
+    def has_native_readinto(self):
+        return False
+
+    # return a buffer of bytes at given offset in given size from given
+    # path sharing memory with the backend (e.g., a mapped file) to avoid
+    # copies, or None if not supported
+    def read_buffer(self, filepath, offset, size):
+        return None
+
     # write bytes to given path with bytes
     @abstractmethod
     def write(self, filepath, offset, buf):
         pass
 
+    # copy bytes at given offset in given size from a path to another
+    # path at given offset and return the number of bytes copied
+    def copy_range(self, src_path, src_offset, dst_path, dst_offset, size):
+        buf = self.read(src_path, src_offset, size)
+        if not buf:
+            return 0
+
+        self.write(dst_path, dst_offset, buf)
+        return len(buf)
+
+    # check if copy_range copies in the backend without passing data
+    # through python
+    def has_native_copy_range(self):
+        return False
+
+    # hint that given path will be written up to offset + size, so space
+    # can be allocated at once rather than as the file grows
+    def preallocate(self, filepath, offset, size):
+        pass
+
     # truncate given path with size
     @abstractmethod
     def truncate(self, filepath, size):
@@ -195,6 +249,15 @@ class afsbase(object):
     def set_notification_cb(self, notification_cb):
         pass
 
+    # set a callback to ask for a resync of a directory tree (path)
+    # when changes under it may have been missed
+    def set_resync_cb(self, resync_cb):
+        pass
+
+    # return statistics of the plugin as a dict
+    def get_stats(self):
+        return {}
+
     # check what gateways are suported with this plugin
     @abstractmethod
     def get_supported_gateways(self):
@@ -203,3 +266,7 @@ class afsbase(object):
     @abstractmethod
     def get_supported_replication_mode(self):
         pass
+
+    # check if operations can be called concurrently from multiple threads
+    def is_thread_safe(self):
+        return False
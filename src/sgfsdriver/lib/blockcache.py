@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import time
+import mmap
+import hashlib
+import threading
+
+from sgfsdriver.lib.lrucache import lru_cache
+
+DISK_BLOCK_SUFFIX = ".blk"
+
+
+def _sizeof_block(value):
+    # value is (buf, time added)
+    return len(value[0])
+
+
+class disk_cache(object):
+    """
+    blocks spilled to files in a local directory
+
+    Blocks are read back through mmap. max_bytes bounds the total size
+    of the files and is unlimited when 0. Files left by a previous run
+    are removed.
+    """
+    def __init__(self, disk_dir, max_bytes=0, on_evict=None):
+        self.disk_dir = disk_dir
+        self.on_evict = on_evict
+        # key -> (filename, size, time added)
+        self.cache = lru_cache(max_bytes=max_bytes,
+                               sizeof=lambda value: value[1],
+                               on_evict=self._on_evict)
+
+        if not os.path.exists(disk_dir):
+            os.makedirs(disk_dir)
+
+        for name in os.listdir(disk_dir):
+            if name.endswith(DISK_BLOCK_SUFFIX):
+                os.unlink(os.path.join(disk_dir, name))
+
+    def _make_filename(self, key):
+        name = hashlib.md5(repr(key)).hexdigest() + DISK_BLOCK_SUFFIX
+        return os.path.join(self.disk_dir, name)
+
+    def _unlink(self, filename):
+        try:
+            os.unlink(filename)
+        except OSError:
+            pass
+
+    def _on_evict(self, key, value):
+        self._unlink(value[0])
+        if self.on_evict:
+            self.on_evict(key)
+
+    def _read(self, filename, size):
+        if size == 0:
+            return ""
+
+        with open(filename, "rb") as f:
+            mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            try:
+                return mm[:size]
+            finally:
+                mm.close()
+
+    def put(self, key, buf, added):
+        filename = self._make_filename(key)
+        with open(filename, "wb") as f:
+            f.write(buf)
+        self.cache[key] = (filename, len(buf), added)
+
+    def pop(self, key):
+        """
+        remove a block and return (buf, time added), None if not found
+        """
+        value = self.cache.get(key)
+        if value is None:
+            return None
+
+        self.cache.pop(key)
+        filename, size, added = value
+        try:
+            buf = self._read(filename, size)
+        except (IOError, OSError, ValueError):
+            buf = None
+        self._unlink(filename)
+
+        if buf is None:
+            return None
+        return buf, added
+
+    def remove(self, key):
+        value = self.cache.pop(key)
+        if value is not None:
+            self._unlink(value[0])
+
+    def __contains__(self, key):
+        return key in self.cache
+
+    def clear(self):
+        for key in self.cache.keys():
+            self.remove(key)
+
+    def get_stats(self):
+        return self.cache.get_stats()
+
+
+class block_cache(object):
+    """
+    cache of file data blocks keyed by (path, offset, len)
+
+    Blocks are kept in one LRU cache bounded by entries (max_len) and by
+    bytes (max_bytes), and an index maps a path to the (offset, len) of
+    its cached blocks, so dropping all blocks of a file does not scan the
+    whole cache. With disk_dir, blocks evicted from memory are spilled to
+    disk (bounded by disk_bytes) and moved back to memory when hit.
+    """
+    def __init__(self, max_len=0, max_bytes=0, ttl=0, disk_dir=None,
+                 disk_bytes=0):
+        self.ttl = ttl
+        # re-entrant, evictions call back while the lock is held
+        self.lock = threading.RLock()
+        # path -> set of (offset, len)
+        self.index = {}
+        self.cache = lru_cache(max_len=max_len, max_bytes=max_bytes,
+                               ttl=ttl, sizeof=_sizeof_block,
+                               on_evict=self._on_evict)
+        self.disk = None
+        if disk_dir:
+            self.disk = disk_cache(disk_dir, disk_bytes,
+                                   on_evict=self._on_disk_evict)
+
+        self.hit_bytes = 0
+        self.miss_bytes = 0
+
+    def _is_expired(self, added):
+        if self.ttl > 0:
+            return time.time() - added > self.ttl
+        return False
+
+    def _on_evict(self, key, value):
+        # called outside the lock of the memory cache
+        with self.lock:
+            if not self._is_indexed(key) or key in self.cache:
+                # invalidated or put again after the eviction
+                return
+
+            buf, added = value
+            if self.disk and not self._is_expired(added):
+                try:
+                    self.disk.put(key, buf, added)
+                    return
+                except (IOError, OSError):
+                    pass
+            self._unindex(key)
+
+    def _on_disk_evict(self, key):
+        with self.lock:
+            if key not in self.cache:
+                self._unindex(key)
+
+    def _is_indexed(self, key):
+        blocks = self.index.get(key[0])
+        return blocks is not None and key[1:] in blocks
+
+    def _unindex(self, key):
+        path = key[0]
+        blocks = self.index.get(path)
+        if blocks is not None:
+            blocks.discard(key[1:])
+            if not blocks:
+                del self.index[path]
+
+    def get(self, path, offset, length):
+        key = (path, offset, length)
+        value = self.cache.get(key)
+        if value is None and self.disk:
+            with self.lock:
+                value = self.disk.pop(key)
+                if value is not None:
+                    if self._is_expired(value[1]):
+                        self._unindex(key)
+                        value = None
+                    else:
+                        # move back to memory
+                        self.cache[key] = value
+
+        if value is None:
+            self.miss_bytes += length
+            return None
+
+        self.hit_bytes += len(value[0])
+        return value[0]
+
+    def put(self, path, offset, length, buf):
+        key = (path, offset, length)
+        with self.lock:
+            blocks = self.index.get(path)
+            if blocks is None:
+                blocks = set()
+                self.index[path] = blocks
+            blocks.add((offset, length))
+            if self.disk:
+                self.disk.remove(key)
+            self.cache[key] = (buf, time.time())
+
+    def contains(self, path, offset, length):
+        key = (path, offset, length)
+        if key in self.cache:
+            return True
+        return self.disk is not None and key in self.disk
+
+    def invalidate(self, path):
+        with self.lock:
+            blocks = self.index.pop(path, None)
+            if blocks:
+                for offset, length in blocks:
+                    key = (path, offset, length)
+                    self.cache.pop(key)
+                    if self.disk:
+                        self.disk.remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.index.clear()
+            self.cache.clear()
+            if self.disk:
+                self.disk.clear()
+
+    def get_stats(self):
+        stats = self.cache.get_stats()
+        stats["files"] = len(self.index)
+        stats["hit_bytes"] = self.hit_bytes
+        stats["miss_bytes"] = self.miss_bytes
+        if self.disk:
+            for k, v in self.disk.get_stats().iteritems():
+                stats["disk_" + k] = v
+        return stats
+
+    def __len__(self):
+        return len(self.cache)
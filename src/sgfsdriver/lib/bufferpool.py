@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import threading
+
+
+class buffer_pool(object):
+    """
+    pool of reusable bytearrays for reads
+
+    A buffer taken from the pool is at least as large as requested and
+    may be larger. At most max_buffers idle buffers of max_bytes in
+    total are kept (unlimited bytes when 0); smaller buffers are dropped
+    first.
+    """
+    def __init__(self, max_buffers=16, max_bytes=0):
+        self.max_buffers = max_buffers
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.buffers = []
+        self.bytes = 0
+
+    def get(self, size):
+        with self.lock:
+            for i in xrange(len(self.buffers) - 1, -1, -1):
+                if len(self.buffers[i]) >= size:
+                    buf = self.buffers.pop(i)
+                    self.bytes -= len(buf)
+                    return buf
+
+        return bytearray(size)
+
+    def _is_over_limit(self):
+        if len(self.buffers) > self.max_buffers:
+            return True
+        return self.max_bytes > 0 and self.bytes > self.max_bytes
+
+    def put(self, buf):
+        if self.max_bytes > 0 and len(buf) > self.max_bytes:
+            # too large to keep
+            return
+
+        with self.lock:
+            self.buffers.append(buf)
+            self.bytes += len(buf)
+            while self._is_over_limit():
+                # keep larger buffers
+                i = min(xrange(len(self.buffers)),
+                        key=lambda i: len(self.buffers[i]))
+                self.bytes -= len(self.buffers.pop(i))
+
+    def buffer(self, size):
+        return pooled_buffer(self, size)
+
+    def __len__(self):
+        return len(self.buffers)
+
+
+class pooled_buffer(object):
+    """
+    buffer taken from buffer_pool for a with statement
+    """
+    def __init__(self, pool, size):
+        self.pool = pool
+        self.size = size
+        self.buf = None
+
+    def __enter__(self):
+        self.buf = self.pool.get(self.size)
+        return self.buf
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.pool.put(self.buf)
+        self.buf = None
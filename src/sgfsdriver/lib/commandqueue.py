@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import threading
+
+from collections import OrderedDict
+
+
+class command_queue(object):
+    """
+    FIFO of metadata commands with at most one command per path
+
+    A command for a path that is already queued replaces the queued one,
+    since only the latest state of the path matters; a put followed by a
+    delete leaves only the delete. The merged command moves to the tail,
+    so commands of parents and children keep the order they were put in
+    (e.g. deletes of children before the delete of their directory).
+    Semaphores given with merged commands are all returned with the
+    surviving command, so every waiter is released when it is processed.
+    Commands put with priority are taken before all others.
+    """
+    def __init__(self):
+        self.cond = threading.Condition(threading.Lock())
+        # path -> (cmd, list of semaphores)
+        self.commands = OrderedDict()
+        self.priority_commands = OrderedDict()
+
+        self.queued = 0
+        self.merged = 0
+        self.processed = 0
+
+    def put(self, cmd, sem=None, priority=False):
+        path = cmd['path']
+        with self.cond:
+            self.queued += 1
+            if path in self.priority_commands:
+                commands = self.priority_commands
+            elif priority:
+                commands = self.priority_commands
+                if path in self.commands:
+                    # move ahead of the others
+                    commands[path] = self.commands.pop(path)
+            else:
+                commands = self.commands
+
+            entry = commands.get(path)
+            if entry is None:
+                sems = []
+                commands[path] = (cmd, sems)
+            else:
+                # move to the tail, after commands of its children
+                sems = entry[1]
+                del commands[path]
+                commands[path] = (cmd, sems)
+                self.merged += 1
+
+            if sem:
+                sems.append(sem)
+            self.cond.notify()
+
+    def get(self, block=True):
+        """
+        return the oldest (cmd, list of semaphores), None if empty and
+        not blocking
+        """
+        batch = self.get_batch(1, block)
+        if batch:
+            return batch[0]
+        return None
+
+    def get_batch(self, max_len, block=True):
+        """
+        return up to max_len oldest (cmd, list of semaphores)
+        """
+        with self.cond:
+            while not self.commands and not self.priority_commands:
+                if not block:
+                    return []
+                self.cond.wait()
+
+            batch = []
+            for commands in [self.priority_commands, self.commands]:
+                while commands and len(batch) < max_len:
+                    path, entry = commands.popitem(last=False)
+                    batch.append(entry)
+            return batch
+
+    def task_done(self, count=1):
+        with self.cond:
+            self.processed += count
+
+    def empty(self):
+        with self.cond:
+            return not self.commands and not self.priority_commands
+
+    def __len__(self):
+        return len(self.commands) + len(self.priority_commands)
+
+    def get_stats(self):
+        with self.cond:
+            return {
+                "depth": len(self),
+                "queued": self.queued,
+                "merged": self.merged,
+                "processed": self.processed
+            }
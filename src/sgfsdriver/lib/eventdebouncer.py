@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import time
+import threading
+
+from collections import OrderedDict
+
+# shortest wait between rounds, so a zero window does not spin
+MIN_WAIT = 0.01
+
+
+def _merge_operations(old_op, new_op):
+    # a file created in the window is still new when modified
+    if old_op == "create" and new_op == "modify":
+        return "create"
+    return new_op
+
+
+class pending_event(object):
+    def __init__(self, operation, now):
+        self.operation = operation
+        self.first_time = now
+        self.last_time = now
+        self.urgent = False
+
+
+class event_debouncer(object):
+    """
+    coalesces change events ("create", "modify", "remove") per path
+
+    An event is held until no other event of the path came for window
+    seconds, but not longer than max_delay seconds after the first one.
+    Events of a path merge into one: create and modify give create, and
+    modifies of a removed path are dropped. Events marked urgent are
+    delivered at the next round. deliver(events) is called from a
+    background thread with a list of (operation, path). If it raises,
+    the events of the batch are counted as failed and on_error(events)
+    is called while the exception is handled, so it can be logged. The
+    lag of an event is the time from its first notice to its delivery.
+    """
+    def __init__(self, deliver, window=1.0, max_delay=30.0, on_error=None):
+        self.deliver = deliver
+        self.on_error = on_error
+        self.window = window
+        self.max_delay = max_delay
+
+        self.cond = threading.Condition(threading.Lock())
+        # path -> pending_event
+        self.events = OrderedDict()
+        self.thread = None
+        self.running = False
+        # an urgent event came since the last round
+        self.urgent = False
+
+        self.received = 0
+        self.delivered = 0
+        self.failed = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+
+    def start(self):
+        with self.cond:
+            if self.thread:
+                return
+            self.running = True
+            self.thread = threading.Thread(target=self._run)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            thread = self.thread
+            self.running = False
+            self.thread = None
+            self.cond.notify()
+
+        if thread:
+            thread.join()
+        # deliver what is left
+        self._deliver(self._take(True))
+
+    def add(self, operation, path, urgent=False):
+        now = time.time()
+        with self.cond:
+            self.received += 1
+            event = self.events.get(path)
+            if event is None:
+                event = pending_event(operation, now)
+                self.events[path] = event
+            else:
+                if event.operation == "remove" and operation == "modify":
+                    # modify of a removed path
+                    return
+                event.operation = _merge_operations(event.operation,
+                                                    operation)
+                event.last_time = now
+
+            if urgent:
+                event.urgent = True
+                self.urgent = True
+                self.cond.notify()
+
+    def _is_due(self, event, now):
+        if event.urgent:
+            return True
+        if now - event.last_time >= self.window:
+            return True
+        return now - event.first_time >= self.max_delay
+
+    def _take(self, take_all=False):
+        now = time.time()
+        with self.cond:
+            self.urgent = False
+            due = []
+            for path, event in self.events.iteritems():
+                if take_all or self._is_due(event, now):
+                    due.append(path)
+
+            batch = []
+            for path in due:
+                event = self.events.pop(path)
+                batch.append((event.operation, path))
+
+                lag = now - event.first_time
+                self.lag_total += lag
+                self.lag_max = max(self.lag_max, lag)
+            self.delivered += len(batch)
+            return batch
+
+    def _deliver(self, batch):
+        if not batch:
+            return
+
+        try:
+            self.deliver(batch)
+        except Exception:
+            with self.cond:
+                self.failed += len(batch)
+            if self.on_error:
+                self.on_error(batch)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                if not self.running:
+                    return
+                if not self.urgent:
+                    # notified early by urgent events
+                    self.cond.wait(max(self.window / 2.0, MIN_WAIT))
+                if not self.running:
+                    return
+
+            self._deliver(self._take())
+
+    def get_stats(self):
+        with self.cond:
+            lag_avg = 0.0
+            if self.delivered:
+                lag_avg = self.lag_total / self.delivered
+            return {
+                "pending": len(self.events),
+                "received": self.received,
+                "delivered": self.delivered,
+                "failed": self.failed,
+                "lag_avg": lag_avg,
+                "lag_max": self.lag_max
+            }
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import io
+import os
+import time
+import threading
+
+from collections import OrderedDict
+
+# available from python 3.3
+os_pread = getattr(os, "pread", None)
+os_pwrite = getattr(os, "pwrite", None)
+# available from python 3.7
+os_preadv = getattr(os, "preadv", None)
+
+
+class cached_fd(object):
+    """
+    file descriptor shared by threads
+
+    Reads and writes take the offset with them, so threads do not race
+    on the offset of the descriptor. Without pread/pwrite, a seek and a
+    read (or write) are done together under the lock of the descriptor.
+    Leaving a with statement on it releases it back to the cache.
+    """
+    def __init__(self, cache, fd):
+        self.cache = cache
+        self.fd = fd
+        self.lock = threading.Lock()
+        # references by the cache and by callers
+        self.refs = 1
+        self.opened = time.time()
+        # used since it was last considered for eviction
+        self.referenced = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cache._release(self)
+
+    def pread(self, size, offset):
+        if os_pread:
+            return os_pread(self.fd, size, offset)
+
+        with self.lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            return os.read(self.fd, size)
+
+    def preadinto(self, buf, offset):
+        if os_preadv:
+            return os_preadv(self.fd, [buf], offset)
+
+        # reads into the buffer, without reading to a new string first
+        view = memoryview(buf)
+        f = io.FileIO(self.fd, "r", closefd=False)
+        read_len = 0
+        with self.lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            while read_len < len(view):
+                n = f.readinto(view[read_len:])
+                if not n:
+                    break
+                read_len += n
+        return read_len
+
+    def pwrite(self, buf, offset):
+        if os_pwrite:
+            while buf:
+                written = os_pwrite(self.fd, buf, offset)
+                buf = buf[written:]
+                offset += written
+            return
+
+        with self.lock:
+            os.lseek(self.fd, offset, os.SEEK_SET)
+            while buf:
+                written = os.write(self.fd, buf)
+                buf = buf[written:]
+
+
+class fd_cache(object):
+    """
+    cache of open file descriptors keyed by (path, flags)
+
+    open() returns a descriptor to use in a with statement, which is
+    opened on a miss and kept for later calls. At most max_len
+    descriptors are kept; the least recently used one is closed first,
+    approximated by giving descriptors used since the last eviction
+    round a second chance, so a hit does not reorder the cache. A
+    descriptor in use is closed only when the last user is done with
+    it, even if it was evicted or invalidated meanwhile. Entries expire
+    after ttl seconds (unlimited when 0) so changes made behind the
+    cache are seen eventually; invalidate() drops the descriptors of a
+    path at once. Nothing is cached when max_len is 0.
+    """
+    def __init__(self, max_len=64, ttl=0):
+        self.max_len = max_len
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # (path, flags) -> cached_fd, in order of opening
+        self.entries = OrderedDict()
+        # flags used so far, to find entries of a path
+        self.flags = set()
+        # changed by invalidations, to not cache what was opened before
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _release(self, entry):
+        with self.lock:
+            entry.refs -= 1
+            if entry.refs > 0:
+                return
+        os.close(entry.fd)
+
+    def _is_expired(self, entry):
+        if self.ttl > 0:
+            return time.time() - entry.opened > self.ttl
+        return False
+
+    def _shrink(self):
+        # returns evicted entries
+        evicted = []
+        while len(self.entries) > self.max_len:
+            key, entry = self.entries.popitem(last=False)
+            if entry.referenced and not self._is_expired(entry):
+                # second chance
+                entry.referenced = False
+                self.entries[key] = entry
+                continue
+            evicted.append(entry)
+        self.evictions += len(evicted)
+        return evicted
+
+    def open(self, path, flags, mode=0777):
+        key = (path, flags)
+        expired = None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if not self._is_expired(entry):
+                    self.hits += 1
+                    entry.referenced = True
+                    entry.refs += 1
+                    return entry
+
+                expired = self.entries.pop(key)
+            self.misses += 1
+            generation = self.generation
+
+        if expired is not None:
+            self._release(expired)
+
+        entry = cached_fd(self, os.open(path, flags, mode))
+        if self.max_len <= 0:
+            return entry
+
+        evicted = []
+        with self.lock:
+            if generation == self.generation:
+                entry.refs += 1
+                self.flags.add(flags)
+                old_entry = self.entries.pop(key, None)
+                if old_entry is not None:
+                    # opened by another thread at the same time
+                    evicted.append(old_entry)
+                self.entries[key] = entry
+                evicted.extend(self._shrink())
+
+        for old_entry in evicted:
+            self._release(old_entry)
+        return entry
+
+    def invalidate(self, path):
+        entries = []
+        with self.lock:
+            self.generation += 1
+            for flags in self.flags:
+                entry = self.entries.pop((path, flags), None)
+                if entry is not None:
+                    entries.append(entry)
+
+        for entry in entries:
+            self._release(entry)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            entries = self.entries.values()
+            self.entries.clear()
+
+        for entry in entries:
+            self._release(entry)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+    def __len__(self):
+        return len(self.entries)
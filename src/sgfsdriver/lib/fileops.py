@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+File operations of the kernel not exposed by the os module of python 2.7
+
+The os module is used when it has them, otherwise they are called from
+libc through ctypes. Functions return None when the operation is not
+available at all.
+"""
+
+import os
+import errno
+import ctypes
+import ctypes.util
+
+# available from python 3.8
+os_copy_file_range = getattr(os, "copy_file_range", None)
+# available from python 3.3
+os_sendfile = getattr(os, "sendfile", None)
+
+# errors telling the operation is not possible for the given files
+UNSUPPORTED_ERRNOS = set([errno.ENOSYS, errno.EXDEV, errno.EINVAL,
+                          errno.EOPNOTSUPP, errno.EBADF])
+
+# fallocate modes from linux/falloc.h
+FALLOC_FL_KEEP_SIZE = 0x01
+
+
+def _load_libc():
+    try:
+        return ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None
+
+libc = _load_libc()
+
+
+def _get_libc_func(names, argtypes, restype):
+    if libc is None:
+        return None
+
+    for name in names:
+        func = getattr(libc, name, None)
+        if func is not None:
+            func.argtypes = argtypes
+            func.restype = restype
+            return func
+    return None
+
+libc_copy_file_range = None
+if not os_copy_file_range:
+    libc_copy_file_range = _get_libc_func(
+        ["copy_file_range"],
+        [ctypes.c_int, ctypes.POINTER(ctypes.c_int64), ctypes.c_int,
+         ctypes.POINTER(ctypes.c_int64), ctypes.c_size_t, ctypes.c_uint],
+        ctypes.c_ssize_t)
+
+libc_sendfile = None
+if not os_sendfile:
+    libc_sendfile = _get_libc_func(
+        ["sendfile64", "sendfile"],
+        [ctypes.c_int, ctypes.c_int, ctypes.POINTER(ctypes.c_int64),
+         ctypes.c_size_t],
+        ctypes.c_ssize_t)
+
+libc_fallocate = _get_libc_func(
+    ["fallocate64", "fallocate"],
+    [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64],
+    ctypes.c_int)
+
+
+def _raise_errno():
+    e = ctypes.get_errno()
+    raise OSError(e, os.strerror(e))
+
+
+def copy_file_range(src_fd, src_offset, dst_fd, dst_offset, size):
+    """
+    copy up to size bytes between offsets of two files in the kernel
+    and return the number of bytes copied, 0 at the end of src_fd
+    """
+    if os_copy_file_range:
+        return os_copy_file_range(src_fd, dst_fd, size, src_offset,
+                                  dst_offset)
+
+    if libc_copy_file_range:
+        src_off = ctypes.c_int64(src_offset)
+        dst_off = ctypes.c_int64(dst_offset)
+        copied = libc_copy_file_range(src_fd, ctypes.byref(src_off),
+                                      dst_fd, ctypes.byref(dst_off),
+                                      size, 0)
+        if copied < 0:
+            _raise_errno()
+        return copied
+    return None
+
+
+def sendfile(dst_fd, src_fd, src_offset, size):
+    """
+    copy up to size bytes at src_offset of src_fd to the current offset
+    of dst_fd in the kernel and return the number of bytes copied
+    """
+    if os_sendfile:
+        return os_sendfile(dst_fd, src_fd, src_offset, size)
+
+    if libc_sendfile:
+        src_off = ctypes.c_int64(src_offset)
+        copied = libc_sendfile(dst_fd, src_fd, ctypes.byref(src_off), size)
+        if copied < 0:
+            _raise_errno()
+        return copied
+    return None
+
+
+def fallocate(fd, mode, offset, size):
+    """
+    allocate disk space of a range of a file and return True, None if
+    it is not available
+    """
+    if libc_fallocate:
+        if libc_fallocate(fd, mode, offset, size) < 0:
+            _raise_errno()
+        return True
+    return None
+
+
+def has_copy_file_range():
+    return bool(os_copy_file_range or libc_copy_file_range)
+
+
+def has_sendfile():
+    return bool(os_sendfile or libc_sendfile)
+
+
+def has_fallocate():
+    return bool(libc_fallocate)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import thread
+import threading
+import weakref
+
+
+class rwlock(object):
+    """
+    re-entrant reader/writer lock
+
+    Using the lock in a with statement takes it exclusively. The exclusive
+    owner can take the lock again in either mode, but a shared holder
+    cannot upgrade to exclusive. Waiting writers block new readers.
+    """
+    def __init__(self):
+        self.cond = threading.Condition(threading.Lock())
+        self.owner = None
+        self.owner_count = 0
+        self.readers = {}
+        self.writers_waiting = 0
+
+    def acquire(self):
+        me = thread.get_ident()
+        with self.cond:
+            if self.owner == me:
+                self.owner_count += 1
+                return True
+
+            if me in self.readers:
+                raise RuntimeError("cannot upgrade a shared lock")
+
+            self.writers_waiting += 1
+            try:
+                while self.owner is not None or self.readers:
+                    self.cond.wait()
+            finally:
+                self.writers_waiting -= 1
+
+            self.owner = me
+            self.owner_count = 1
+            return True
+
+    def release(self):
+        me = thread.get_ident()
+        with self.cond:
+            if self.owner != me:
+                raise RuntimeError("cannot release un-acquired lock")
+
+            self.owner_count -= 1
+            if self.owner_count == 0:
+                self.owner = None
+                self.cond.notify_all()
+
+    def acquire_shared(self):
+        me = thread.get_ident()
+        with self.cond:
+            if self.owner == me:
+                # nested in the exclusive section
+                self.owner_count += 1
+                return True
+
+            if me in self.readers:
+                self.readers[me] += 1
+                return True
+
+            while self.owner is not None or self.writers_waiting > 0:
+                self.cond.wait()
+
+            self.readers[me] = 1
+            return True
+
+    def release_shared(self):
+        me = thread.get_ident()
+        with self.cond:
+            if self.owner == me:
+                self.owner_count -= 1
+                if self.owner_count == 0:
+                    self.owner = None
+                    self.cond.notify_all()
+                return
+
+            if me not in self.readers:
+                raise RuntimeError("cannot release un-acquired lock")
+
+            self.readers[me] -= 1
+            if self.readers[me] == 0:
+                del self.readers[me]
+                if not self.readers:
+                    self.cond.notify_all()
+
+    def shared(self):
+        return shared_lock(self)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class shared_lock(object):
+    """
+    shared side of rwlock for a with statement
+    """
+    def __init__(self, lock):
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire_shared()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.lock.release_shared()
+
+
+class null_lock(object):
+    """
+    lock that does nothing, used by thread-safe plugins
+    """
+    def acquire(self):
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+class lock_manager(object):
+    """
+    rwlocks keyed by path
+
+    A lock lives while someone holds it, so every user of the same path
+    gets the same lock.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.locks = weakref.WeakValueDictionary()
+
+    def get_lock(self, path):
+        with self.lock:
+            l = self.locks.get(path)
+            if l is None:
+                l = rwlock()
+                self.locks[path] = l
+            return l
+
+    def rename(self, from_path, to_path):
+        with self.lock:
+            l = self.locks.get(from_path)
+            if l is not None:
+                del self.locks[from_path]
+                self.locks[to_path] = l
+
+    def __len__(self):
+        return len(self.locks)
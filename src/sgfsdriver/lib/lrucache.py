@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import time
+import threading
+
+from collections import OrderedDict
+
+
+class lru_cache(object):
+    """
+    thread-safe LRU cache bounded by entry count and by bytes
+
+    max_len, max_bytes and ttl (seconds) are unlimited when 0. sizeof
+    gives the size of a value in bytes and is re-evaluated when the value
+    is accessed, so values may grow. on_evict(key, value) is called for
+    entries pushed out by the limits or expired, outside the cache lock.
+    """
+    def __init__(self, max_len=0, max_bytes=0, ttl=0, sizeof=None,
+                 on_evict=None):
+        self.max_len = max_len
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+
+        self.lock = threading.RLock()
+        # key -> (value, size, time added)
+        self.entries = OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _size(self, value):
+        if self.sizeof:
+            return self.sizeof(value)
+        return 0
+
+    def _is_expired(self, entry):
+        if self.ttl > 0:
+            return time.time() - entry[2] > self.ttl
+        return False
+
+    def _remove(self, key):
+        value, size, added = self.entries.pop(key)
+        self.bytes -= size
+        return value
+
+    def _shrink(self, keep_key=None):
+        # returns evicted (key, value) pairs
+        evicted = []
+        while self._is_over_limit():
+            # take the least recently used without copying the keys
+            victim = None
+            for key in self.entries:
+                if key != keep_key:
+                    victim = key
+                    break
+
+            if victim is None:
+                break
+            evicted.append((victim, self._remove(victim)))
+        return evicted
+
+    def _is_over_limit(self):
+        if self.max_len > 0 and len(self.entries) > self.max_len:
+            return True
+        if self.max_bytes > 0 and self.bytes > self.max_bytes:
+            return True
+        return False
+
+    def _evict(self, evicted):
+        self.evictions += len(evicted)
+        if self.on_evict:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+    def get(self, key, default=None):
+        evicted = []
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self._is_expired(entry):
+                evicted.append((key, self._remove(key)))
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                value = default
+            else:
+                self.hits += 1
+                value, size, added = entry
+                new_size = self._size(value)
+                # move to the most recently used end
+                del self.entries[key]
+                self.entries[key] = (value, new_size, added)
+                self.bytes += new_size - size
+                evicted.extend(self._shrink(key))
+
+        self._evict(evicted)
+        return value
+
+    def __getitem__(self, key):
+        marker = self.entries
+        value = self.get(key, marker)
+        if value is marker:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            size = self._size(value)
+            self.entries[key] = (value, size, time.time())
+            self.bytes += size
+            evicted = self._shrink(key)
+
+        self._evict(evicted)
+
+    def __delitem__(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def __contains__(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry is not None and not self._is_expired(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            if key in self.entries:
+                return self._remove(key)
+            return default
+
+    def keys(self):
+        with self.lock:
+            return self.entries.keys()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import mmap
+
+from sgfsdriver.lib.lrucache import lru_cache
+
+
+class mmap_cache(object):
+    """
+    read-only mappings of whole files keyed by path
+
+    read_buffer() returns a buffer over the mapping of the file, so data
+    is not copied until the caller writes it out. A file whose size
+    changed since it was mapped is mapped again. At most max_len files
+    are kept mapped and mappings expire after ttl seconds (unlimited
+    when 0); invalidate() drops the mapping of a path at once. Dropped
+    mappings are unmapped when the last buffer over them is gone.
+
+    Reading a mapped page beyond the end of a file that was truncated
+    meanwhile raises SIGBUS, so this is only for files that do not
+    shrink while being read.
+    """
+    def __init__(self, max_len=64, ttl=0):
+        self.cache = lru_cache(max_len=max_len, ttl=ttl)
+        self.lock = self.cache.lock
+        # changed by invalidations, to not cache what was mapped before
+        self.generation = 0
+
+    def _map(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            size = os.fstat(fd).st_size
+            if size == 0:
+                # empty files cannot be mapped
+                return None
+            # the mapping keeps its own descriptor
+            return mmap.mmap(fd, size, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+
+    def _get(self, path):
+        with self.lock:
+            mm = self.cache.get(path)
+            generation = self.generation
+
+        # size() checks the current size of the file
+        if mm is not None and mm.size() == len(mm):
+            return mm
+
+        mm = self._map(path)
+        with self.lock:
+            if generation == self.generation:
+                if mm is None:
+                    self.cache.pop(path)
+                else:
+                    self.cache[path] = mm
+        return mm
+
+    def read_buffer(self, path, offset, size):
+        mm = self._get(path)
+        if mm is None:
+            return ""
+        # python 2 mmap gives no memoryview, buffer shares the mapping
+        return buffer(mm, offset, size)
+
+    def invalidate(self, path):
+        with self.lock:
+            self.generation += 1
+            self.cache.pop(path)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.cache.clear()
+
+    def get_stats(self):
+        return self.cache.get_stats()
+
+    def __len__(self):
+        return len(self.cache)
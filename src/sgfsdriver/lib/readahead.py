@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import threading
+
+from multiprocessing.pool import ThreadPool
+from sgfsdriver.lib.lrucache import lru_cache
+
+
+class read_stream(object):
+    """
+    read state of a file
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # offset expected by the next sequential read
+        self.next_offset = 0
+        # chunks to prefetch ahead
+        self.window = 0
+        # end of the range prefetched so far
+        self.prefetched = 0
+        # end of file found by a short read
+        self.eof = None
+        self.invalidated = False
+
+
+class read_ahead(object):
+    """
+    sequential read detection and prefetch
+
+    on_read() is called for every read of a file. While the file is read
+    in order, the next chunks of the same length are fetched on a thread
+    pool by fetch(path, offset, length, stream), which returns the number
+    of bytes read. The number of chunks prefetched starts at 1 and doubles
+    up to max_window while reads stay sequential; a random read stops it.
+    """
+    def __init__(self, fetch, max_window=8, concurrency=4,
+                 max_streams=1024):
+        self.fetch = fetch
+        self.max_window = max_window
+        self.concurrency = concurrency
+        self.streams = lru_cache(max_len=max_streams)
+        self.pool = None
+        self.pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = ThreadPool(self.concurrency)
+            return self.pool
+
+    def _get_stream(self, path):
+        with self.streams.lock:
+            stream = self.streams.get(path)
+            if stream is None:
+                stream = read_stream()
+                self.streams[path] = stream
+            return stream
+
+    def _fetch(self, path, offset, length, stream):
+        try:
+            read_len = self.fetch(path, offset, length, stream)
+        except Exception:
+            # the read will be retried on demand
+            return
+
+        if read_len < length:
+            with stream.lock:
+                end = offset + read_len
+                if stream.eof is None or end < stream.eof:
+                    stream.eof = end
+
+    def on_read(self, path, offset, length):
+        if self.max_window <= 0 or length <= 0:
+            return
+
+        stream = self._get_stream(path)
+        offsets = []
+        with stream.lock:
+            if offset == stream.next_offset:
+                stream.window = max(1, min(stream.window * 2,
+                                           self.max_window))
+            else:
+                # random access
+                stream.window = 0
+                stream.prefetched = 0
+                stream.eof = None
+
+            stream.next_offset = offset + length
+            if stream.window == 0:
+                return
+
+            start = max(offset + length, stream.prefetched)
+            end = offset + length * (1 + stream.window)
+            if stream.eof is not None:
+                end = min(end, stream.eof)
+
+            for chunk_offset in xrange(start, end, length):
+                offsets.append(chunk_offset)
+            stream.prefetched = max(stream.prefetched, end)
+
+        if offsets:
+            pool = self._get_pool()
+            for chunk_offset in offsets:
+                pool.apply_async(self._fetch,
+                                 (path, chunk_offset, length, stream))
+
+    def invalidate(self, path):
+        stream = self.streams.pop(path)
+        if stream is not None:
+            with stream.lock:
+                stream.invalidated = True
+
+    def close(self):
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
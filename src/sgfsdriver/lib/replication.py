@@ -17,10 +17,41 @@
 """
 
 import os
+import time
 import threading
 import pickle
+import struct
+import zlib
 
 from abc import ABCMeta, abstractmethod
+from multiprocessing.pool import ThreadPool
+from sgfsdriver.lib.lockmanager import lock_manager
+
+# number of threads to dispatch non-adjacent block runs in parallel
+IO_CONCURRENCY = 8
+# upper bound of a single coalesced read or write
+IO_COALESCE_MAX_BYTES = 8 * 1024 * 1024
+
+io_pool = None
+io_pool_lock = threading.Lock()
+
+# replicas of the same data path share a lock
+replica_locks = lock_manager()
+
+
+def _get_io_pool():
+    global io_pool
+
+    with io_pool_lock:
+        if not io_pool:
+            io_pool = ThreadPool(IO_CONCURRENCY)
+        return io_pool
+
+
+def _to_bytes(buf):
+    if isinstance(buf, memoryview):
+        return buf.tobytes()
+    return buf
 
 
 class undo_event_log(object):
@@ -53,12 +84,28 @@ class undo_size_log(object):
 class undo_block_log(object):
     """
     undo-log block info
+
+    The old data of the block is either given in data or, with source,
+    copied into the log by the backend from (path, offset).
     """
-    def __init__(self, block_id, block_data, block_version, block_size):
+    # defaults for logs unpickled from the legacy format
+    source = None
+    log_offset = None
+    log_len = 0
+
+    def __init__(self, block_id, block_data, block_version, block_size,
+                 source=None):
         self.id = block_id
         self.data = block_data
         self.version = block_version
         self.size = block_size
+        self.source = source
+        # where the old data is in the log file once written
+        self.log_offset = None
+        self.log_len = 0
+
+    def has_data(self):
+        return bool(self.data) or self.log_len > 0
 
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
@@ -71,8 +118,29 @@ class undo_block_log(object):
 class undo_log(object):
     """
     undo-log file containing a list of undo_block_logs
+
+    The file is a small header followed by length-prefixed binary records
+    that are only ever appended. Syncing writes the records added since the
+    last sync at the end of the file instead of rewriting the whole log.
+    The payload of a raw record is copied into the log by the backend
+    before the record header is written, and is not covered by the crc.
     """
     UNDO_LOG_SUFFIX = "undo"
+    UNDO_LOG_MAGIC = "SGUL"
+    UNDO_LOG_FORMAT_VERSION = 2
+    # version 1 has no raw records
+    UNDO_LOG_FORMAT_VERSIONS = [1, 2]
+
+    RECORD_TYPE_BLOCK = 1
+    RECORD_TYPE_SIZE = 2
+
+    RECORD_FLAG_RAW = 1
+
+    # magic, format version
+    HEADER = struct.Struct("!4sH")
+    # record type, flags, block id, block version, block size,
+    # payload length, crc32 of the record
+    RECORD_HEADER = struct.Struct("!BBqqQQI")
 
     def __init__(self, fs, path):
         self.fs = fs
@@ -80,8 +148,17 @@ class undo_log(object):
         self.log_path = undo_log.make_log_path(path)
         self.block_logs = []
         self.event_logs = []
+        self.pending_records = []
+        self.log_size = 0
+        self.legacy = False
         self.synced = True
         self.file_exist = False
+        # the log is read on first use
+        self.loaded = False
+
+    def _load(self):
+        if self.loaded:
+            return
 
         # read logs if exists
         if self.fs.exists(self.log_path):
@@ -89,16 +166,166 @@ class undo_log(object):
             buf = self.fs.read(self.log_path, 0, st.size)
             self._deserialize(buf)
             self.file_exist = True
+        self.loaded = True
 
-    def _serialize(self):
-        data = (self.block_logs, self.event_logs)
-        return pickle.dumps(data)
+    def set_empty(self):
+        # the log is known not to exist
+        if not self.loaded:
+            self.loaded = True
+            self.file_exist = False
+
+    @classmethod
+    def _make_record(cls, rec_type, block_id, block_version, block_size,
+                     payload, flags=0, payload_len=0):
+        if flags & cls.RECORD_FLAG_RAW:
+            # the payload is not part of the record
+            payload = ""
+        else:
+            if payload is None:
+                payload = ""
+            payload = _to_bytes(payload)
+            payload_len = len(payload)
+
+        fields = (rec_type, flags, block_id, block_version, block_size,
+                  payload_len)
+        header = cls.RECORD_HEADER.pack(*(fields + (0,)))
+        crc = zlib.crc32(header[:-4])
+        crc = zlib.crc32(payload, crc) & 0xffffffff
+        header = cls.RECORD_HEADER.pack(*(fields + (crc,)))
+        return header + payload
+
+    def _serialize_record(self, log):
+        if isinstance(log, undo_block_log):
+            return undo_log._make_record(
+                undo_log.RECORD_TYPE_BLOCK,
+                log.id,
+                log.version,
+                log.size,
+                log.data
+            )
+        elif log.type_string() == undo_size_log.TYPE_STR:
+            return undo_log._make_record(
+                undo_log.RECORD_TYPE_SIZE, 0, 0, log.size, None
+            )
+        raise ValueError("unknown undo-log record: %r" % log)
+
+    def _is_raw_record(self, log):
+        # old data is to be copied from the data file by the backend
+        return isinstance(log, undo_block_log) and log.data is None and \
+            log.source is not None
+
+    def _has_raw_records(self):
+        for log in self.pending_records:
+            if self._is_raw_record(log):
+                return True
+        return False
+
+    def _write_pending(self):
+        # append records not written yet
+        # returns the new size of the log
+        offset = self.log_size
+        segment_offset = self.log_size
+        parts = []
+        if offset == 0:
+            header = undo_log.HEADER.pack(
+                undo_log.UNDO_LOG_MAGIC,
+                undo_log.UNDO_LOG_FORMAT_VERSION
+            )
+            offset += undo_log.HEADER.size
+            if self._has_raw_records():
+                # a log cut short after a raw copy must still be
+                # recognized as a log, not as a legacy pickle
+                self.fs.write(self.log_path, 0, header)
+                segment_offset = offset
+            else:
+                parts.append(header)
+
+        # (offset, bytes) written after the backend copied raw payloads,
+        # so a record header is never on disk before its payload
+        segments = []
+        for log in self.pending_records:
+            payload_offset = offset + undo_log.RECORD_HEADER.size
+            if self._is_raw_record(log):
+                src_path, src_offset = log.source
+                payload_len = self.fs.copy_range(src_path, src_offset,
+                                                 self.log_path,
+                                                 payload_offset, log.size)
+                parts.append(undo_log._make_record(
+                    undo_log.RECORD_TYPE_BLOCK, log.id, log.version,
+                    log.size, None, undo_log.RECORD_FLAG_RAW, payload_len
+                ))
+                segments.append((segment_offset, "".join(parts)))
+                parts = []
+                segment_offset = payload_offset + payload_len
+            else:
+                record = self._serialize_record(log)
+                parts.append(record)
+                payload_len = len(record) - undo_log.RECORD_HEADER.size
+
+            if isinstance(log, undo_block_log) and payload_len > 0:
+                log.log_offset = payload_offset
+                log.log_len = payload_len
+            offset = payload_offset + payload_len
+
+        if parts:
+            segments.append((segment_offset, "".join(parts)))
+        for segment_offset, ds in segments:
+            self.fs.write(self.log_path, segment_offset, ds)
+        return offset
 
     def _deserialize(self, buf):
+        if not buf.startswith(undo_log.UNDO_LOG_MAGIC):
+            # logs written in old pickle format
+            self._deserialize_legacy(buf)
+            return
+
+        magic, version = undo_log.HEADER.unpack_from(buf, 0)
+        if version not in undo_log.UNDO_LOG_FORMAT_VERSIONS:
+            raise IOError("unknown undo-log format version %d" % version)
+
+        # replay records sequentially
+        # stop at a record that is torn by an interrupted append
+        offset = undo_log.HEADER.size
+        rec_header_size = undo_log.RECORD_HEADER.size
+        while offset + rec_header_size <= len(buf):
+            rec_type, flags, block_id, block_version, block_size, \
+                payload_len, crc = undo_log.RECORD_HEADER.unpack_from(
+                    buf, offset)
+            payload_offset = offset + rec_header_size
+            if payload_offset + payload_len > len(buf):
+                break
+
+            payload = buf[payload_offset:payload_offset + payload_len]
+            calc_crc = zlib.crc32(buf[offset:payload_offset - 4])
+            if not flags & undo_log.RECORD_FLAG_RAW:
+                calc_crc = zlib.crc32(payload, calc_crc)
+            if calc_crc & 0xffffffff != crc:
+                break
+
+            if rec_type == undo_log.RECORD_TYPE_BLOCK:
+                block_log = undo_block_log(block_id, None, block_version,
+                                           block_size)
+                if payload_len > 0:
+                    block_log.data = payload
+                    block_log.log_offset = payload_offset
+                    block_log.log_len = payload_len
+                self.block_logs.append(block_log)
+            elif rec_type == undo_log.RECORD_TYPE_SIZE:
+                self.event_logs.append(undo_size_log(block_size))
+            else:
+                raise IOError("unknown undo-log record type %d" % rec_type)
+
+            offset = payload_offset + payload_len
+
+        self.log_size = offset
+
+    def _deserialize_legacy(self, buf):
         data = pickle.loads(buf)
         b_logs, e_logs = data
         self.block_logs = b_logs
         self.event_logs = e_logs
+        # rewrite in the binary format when it is synced next time
+        self.legacy = True
 
     def rename(self, new_path):
         new_log_path = undo_log.make_log_path(new_path)
@@ -106,6 +333,7 @@ class undo_log(object):
             # error - file already exists
             return False
 
+        self._load()
         if self.file_exist:
             self.fs.rename(self.log_path, new_log_path)
         self.data_path = new_path
@@ -113,35 +341,60 @@ class undo_log(object):
         return True
 
     def clear(self):
+        if not self.loaded:
+            # no need to read the log to remove it
+            self.file_exist = self.fs.exists(self.log_path)
+            self.loaded = True
+
         if self.file_exist:
             self.fs.unlink(self.log_path)
+            self.file_exist = False
         self.block_logs = []
         self.event_logs = []
+        self.pending_records = []
+        self.log_size = 0
+        self.legacy = False
         self.synced = True
 
     def sync(self):
+        self._load()
         if not self.synced:
-            ds = self._serialize()
-            self.fs.write(self.log_path, 0, ds)
+            if self.legacy:
+                # convert the whole log to the binary format
+                if self.file_exist:
+                    self.fs.unlink(self.log_path)
+                    self.file_exist = False
+                self.pending_records = self.event_logs + self.block_logs
+                self.log_size = 0
+                self.legacy = False
+
+            self.log_size = self._write_pending()
+            self.pending_records = []
             self.synced = True
             self.file_exist = True
 
     def write_block_log(self, block_log, sync_now=True):
+        self._load()
         self.block_logs.append(block_log)
+        self.pending_records.append(block_log)
         self.synced = False
         if sync_now:
             self.sync()
 
     def read_block_logs(self):
+        self._load()
         return self.block_logs
 
     def write_event_log(self, size_log, sync_now=True):
+        self._load()
         self.event_logs.append(size_log)
+        self.pending_records.append(size_log)
         self.synced = False
         if sync_now:
             self.sync()
 
     def read_event_logs(self):
+        self._load()
         return self.event_logs
 
     @classmethod
@@ -189,15 +442,48 @@ class block_meta(object):
 
 
 class meta_file(object):
+    """
+    block metadata file of a replica
+
+    The file is a small header followed by a fixed-width record
+    (flag, version, size) per block. Records are kept in a bytearray in
+    memory and a changed block is synced by writing its record in place.
+
+    Trailing empty records are always trimmed, so the last record is the
+    last non-empty block. The sum of block sizes is kept up to date as
+    records change.
+
+    The header carries a clean flag and a generation number. The flag is
+    cleared when a transaction starts and set again when it completes,
+    so a replica can skip recovery when the flag is set.
+    """
     META_FILE_SUFFIX = "meta"
+    META_FILE_MAGIC = "SGMF"
+    META_FILE_FORMAT_VERSION = 2
+
+    HEADER_FLAG_CLEAN = 0x1
+
+    # magic, format version, flags, generation
+    HEADER = struct.Struct("!4sHHQ")
+    # magic, format version, reserved
+    HEADER_V1 = struct.Struct("!4sHH")
+    # flag, block version, block size
+    RECORD = struct.Struct("!BqQ")
 
     def __init__(self, fs, path):
         self.fs = fs
         self.data_path = path
         self.meta_path = meta_file.make_meta_path(path)
-        self.blocks = []
+        self.records = bytearray()
+        self.dirty_blocks = set()
+        self.disk_blocks = 0
+        self.data_file_size = 0
+        self.legacy = False
         self.synced = True
         self.file_exist = False
+        self.clean = False
+        self.generation = 0
+        self.header_dirty = False
 
         # read meta data if exists
         if self.fs.exists(self.meta_path):
@@ -206,13 +492,103 @@ class meta_file(object):
             self._deserialize(buf)
             self.file_exist = True
 
+    def _serialize_header(self):
+        flags = 0
+        if self.clean:
+            flags |= meta_file.HEADER_FLAG_CLEAN
+        return meta_file.HEADER.pack(
+            meta_file.META_FILE_MAGIC,
+            meta_file.META_FILE_FORMAT_VERSION,
+            flags,
+            self.generation
+        )
+
     def _serialize(self):
-        data = (self.blocks)
-        return pickle.dumps(data)
+        return self._serialize_header() + str(self.records)
 
     def _deserialize(self, buf):
-        data = pickle.loads(buf)
-        self.blocks = data
+        if not buf.startswith(meta_file.META_FILE_MAGIC):
+            # meta data written in old pickle format
+            self._deserialize_legacy(buf)
+            return
+
+        magic, version, _ = meta_file.HEADER_V1.unpack_from(buf, 0)
+        if version == meta_file.META_FILE_FORMAT_VERSION:
+            magic, version, flags, generation = \
+                meta_file.HEADER.unpack_from(buf, 0)
+            self.clean = bool(flags & meta_file.HEADER_FLAG_CLEAN)
+            self.generation = generation
+            header_size = meta_file.HEADER.size
+        elif version == 1:
+            # no clean flag - rewrite in the current format on next sync
+            self.legacy = True
+            header_size = meta_file.HEADER_V1.size
+        else:
+            raise IOError("unknown meta file format version %d" % version)
+
+        # drop a record torn by an interrupted write
+        blocks = (len(buf) - header_size) / meta_file.RECORD.size
+        self.records = bytearray(
+            buffer(buf, header_size, blocks * meta_file.RECORD.size)
+        )
+        self.disk_blocks = blocks
+        self._trim_empty_blocks()
+
+        self.data_file_size = 0
+        for i in xrange(0, self._block_count()):
+            self.data_file_size += self._unpack_block_meta(i).size
+
+    def _deserialize_legacy(self, buf):
+        blocks = pickle.loads(buf)
+        self.records = bytearray(len(blocks) * meta_file.RECORD.size)
+        for i in xrange(0, len(blocks)):
+            self._pack_block_meta(i, blocks[i])
+        self._trim_empty_blocks()
+        # rewrite in the fixed-width format when it is synced next time
+        self.legacy = True
+        self.synced = False
+
+    def _block_count(self):
+        return len(self.records) / meta_file.RECORD.size
+
+    def _pack_block_meta(self, block_id, meta):
+        _, _, old_size = meta_file.RECORD.unpack_from(
+            self.records,
+            block_id * meta_file.RECORD.size
+        )
+        self.data_file_size += meta.size - old_size
+        meta_file.RECORD.pack_into(
+            self.records,
+            block_id * meta_file.RECORD.size,
+            meta.flag,
+            meta.version,
+            meta.size
+        )
+
+    def _unpack_block_meta(self, block_id):
+        flag, version, size = meta_file.RECORD.unpack_from(
+            self.records,
+            block_id * meta_file.RECORD.size
+        )
+        return block_meta(flag, version, size)
+
+    def _is_empty_block(self, block_id):
+        # flag is the first byte of a record
+        flag = self.records[block_id * meta_file.RECORD.size]
+        return flag == block_meta.META_FLAG_EMPTY
+
+    def _trim_empty_blocks(self):
+        # scan backward and trim out
+        # only the blocks emptied since the last trim are visited
+        cut_blocks_to = self._block_count()
+        while cut_blocks_to > 0 and self._is_empty_block(cut_blocks_to - 1):
+            cut_blocks_to -= 1
+
+        del self.records[cut_blocks_to * meta_file.RECORD.size:]
+
+    def _make_dirty(self, block_id):
+        self.dirty_blocks.add(block_id)
+        self.synced = False
 
     def rename(self, new_path):
         new_meta_path = meta_file.make_meta_path(new_path)
@@ -229,69 +605,142 @@ class meta_file(object):
     def clear(self):
         if self.file_exist:
             self.fs.unlink(self.meta_path)
-        self.blocks = []
+            self.file_exist = False
+        self.records = bytearray()
+        self.dirty_blocks = set()
+        self.disk_blocks = 0
+        self.data_file_size = 0
+        self.legacy = False
         self.synced = True
+        self.clean = False
+        self.header_dirty = False
+
+    def _sync_all(self):
+        if self.legacy and self.file_exist:
+            self.fs.unlink(self.meta_path)
+            self.file_exist = False
+
+        ds = self._serialize()
+        self.fs.write(self.meta_path, 0, ds)
+        self.disk_blocks = self._block_count()
+        self.legacy = False
+        self.header_dirty = False
+
+    def _sync_dirty_blocks(self):
+        block_count = self._block_count()
+        empty_record = meta_file.RECORD.pack(block_meta.META_FLAG_EMPTY, 0, 0)
+        rec_size = meta_file.RECORD.size
+
+        # blocks trimmed out only need to be written if they are on disk
+        dirty_blocks = sorted([
+            block_id for block_id in self.dirty_blocks
+            if block_id < block_count or block_id < self.disk_blocks
+        ])
+
+        # write a run of adjacent records at once
+        run_start = 0
+        while run_start < len(dirty_blocks):
+            run_end = run_start + 1
+            while run_end < len(dirty_blocks) and \
+                    dirty_blocks[run_end] == dirty_blocks[run_end - 1] + 1:
+                run_end += 1
+
+            first_block = dirty_blocks[run_start]
+            last_block = dirty_blocks[run_end - 1]
+            buf = str(self.records[
+                first_block * rec_size:
+                min(last_block + 1, block_count) * rec_size
+            ])
+            if last_block >= block_count:
+                buf += empty_record * \
+                    (last_block + 1 - max(first_block, block_count))
+
+            offset = meta_file.HEADER.size + first_block * rec_size
+            if self.header_dirty and first_block == 0:
+                # the header is written with the first run
+                buf = self._serialize_header() + buf
+                offset = 0
+                self.header_dirty = False
+
+            self.fs.write(self.meta_path, offset, buf)
+            self.disk_blocks = max(self.disk_blocks, last_block + 1)
+            run_start = run_end
+
+        if self.header_dirty:
+            self.fs.write(self.meta_path, 0, self._serialize_header())
+            self.header_dirty = False
 
     def sync(self):
         if not self.synced:
-            ds = self._serialize()
-            self.fs.write(self.meta_path, 0, ds)
+            if not self.file_exist or self.legacy:
+                self._sync_all()
+            else:
+                self._sync_dirty_blocks()
+            self.dirty_blocks = set()
             self.synced = True
             self.file_exist = True
 
     def write_block_meta(self, block_id, meta, sync_now=True):
-        if len(self.blocks) > block_id:
-            # overwrite
-            self.blocks[block_id] = meta
-            self.synced = False
-        else:
+        block_count = self._block_count()
+        if block_count <= block_id:
             # zero fill
-            for i in range(0, block_id - len(self.blocks) + 1):
-                empty_block_meta = block_meta(False, 0, 0)
-                self.blocks.append(empty_block_meta)
-                self.synced = False
+            self.records.extend(
+                bytearray((block_id - block_count + 1) *
+                          meta_file.RECORD.size)
+            )
+            # filled blocks not on disk yet are written with the block
+            for i in xrange(max(block_count, self.disk_blocks), block_id):
+                self._make_dirty(i)
 
-            self.blocks[block_id] = meta
-            self.synced = False
+        self._pack_block_meta(block_id, meta)
+        self._make_dirty(block_id)
 
         self.compact_block_meta(sync_now)
 
     def delete_block_meta(self, block_id, sync_now=True):
-        if len(self.blocks) > block_id:
-            self.blocks[block_id].make_empty()
-            self.synced = False
+        if self._block_count() > block_id:
+            self._pack_block_meta(block_id, block_meta(False, 0, 0))
+            self._make_dirty(block_id)
 
         self.compact_block_meta(sync_now)
 
     def compact_block_meta(self, sync_now=True):
-        # scan backward and trim out
-        cut_blocks_to = 0
-        for i in xrange(len(self.blocks), 0, -1):
-            if not self.blocks[i - 1].is_empty():
-                cut_blocks_to = i
-                break
-
-        self.blocks = self.blocks[:cut_blocks_to]
-        self.synced = False
+        self._trim_empty_blocks()
 
         if sync_now:
             self.sync()
 
     def get_block_meta_len(self):
-        return len(self.blocks)
+        return self._block_count()
 
     def read_block_meta(self, block_id):
-        if len(self.blocks) > block_id:
-            return self.blocks[block_id]
+        if self._block_count() > block_id:
+            return self._unpack_block_meta(block_id)
         else:
             return block_meta(False, 0, 0)
 
     def get_data_file_size(self):
-        # scan and sum
-        data_file_size = 0
-        for i in xrange(0, len(self.blocks)):
-            data_file_size += self.blocks[i].size
-        return data_file_size
+        return self.data_file_size
+
+    def is_clean(self):
+        return self.clean
+
+    def set_clean(self, clean, sync_now=True):
+        if clean:
+            # a new generation of consistent data
+            self.generation += 1
+        elif not self.clean:
+            return
+        self.clean = clean
+        self.header_dirty = True
+        self.synced = False
+
+        if sync_now:
+            self.sync()
+
+    def get_meta_size(self):
+        # bytes held in memory
+        return meta_file.HEADER.size + len(self.records)
 
     @classmethod
     def make_meta_path(self, path):
@@ -308,7 +757,7 @@ class meta_file(object):
 
     def __repr__(self):
         return "<meta_file data(%s) meta(%s) blocks(%d)>" % \
-            (self.data_path, self.meta_path, len(self.blocks))
+            (self.data_path, self.meta_path, self._block_count())
 
 
 class data_block(object):
@@ -325,19 +774,182 @@ class data_block(object):
             (self.id, self.version, len(self.data))
 
 
+class commit_policy(object):
+    """
+    flush trigger of a group commit
+
+    a batch is committed when it holds max_blocks blocks or max_bytes bytes
+    (0 means no limit), or when window seconds passed since the first write
+    joined the batch. with the default window of 0, writes that arrive
+    while the previous batch is being committed are grouped.
+    """
+    def __init__(self, max_blocks=0, max_bytes=0, window=0):
+        self.max_blocks = max_blocks
+        self.max_bytes = max_bytes
+        self.window = window
+
+    def is_full(self, blocks, nbytes):
+        if self.max_blocks > 0 and blocks >= self.max_blocks:
+            return True
+        if self.max_bytes > 0 and nbytes >= self.max_bytes:
+            return True
+        return False
+
+    def __repr__(self):
+        return "<commit_policy %d %d %f>" % \
+            (self.max_blocks, self.max_bytes, self.window)
+
+
+class commit_batch(object):
+    """
+    block writes and deletes committed in a single transaction
+    """
+    def __init__(self):
+        self.ops = []
+        self.blocks = 0
+        self.nbytes = 0
+        self.done = False
+        self.error = None
+
+    def add(self, delete, data_blocks):
+        # merge with the previous op of the same kind
+        if self.ops and self.ops[-1][0] == delete:
+            self.ops[-1][1].extend(data_blocks)
+        else:
+            self.ops.append((delete, list(data_blocks)))
+
+        self.blocks += len(data_blocks)
+        for dblock in data_blocks:
+            if dblock.data:
+                self.nbytes += len(dblock.data)
+
+
+class group_commit(object):
+    """
+    batches block writes to a replica into one transaction
+
+    the first writer of a batch commits the batch on behalf of all writers
+    joined to it. every writer returns after its batch is committed,
+    so a write is durable when it returns.
+    """
+    def __init__(self, repl, policy=None):
+        self.replica = repl
+        if policy:
+            self.policy = policy
+        else:
+            self.policy = commit_policy()
+        self.cond = threading.Condition(threading.Lock())
+        self.batch = None
+        # batches not committed yet
+        self.inflight = 0
+
+    def _is_full(self, batch):
+        return self.policy.is_full(batch.blocks, batch.nbytes)
+
+    def write_data_blocks(self, data_blocks):
+        self._submit(False, data_blocks)
+
+    def delete_data_blocks(self, data_blocks):
+        self._submit(True, data_blocks)
+
+    def _submit(self, delete, data_blocks):
+        with self.cond:
+            # a full batch does not take more blocks
+            while self.batch and self._is_full(self.batch):
+                self.cond.wait()
+
+            batch = self.batch
+            leader = False
+            if not batch:
+                batch = commit_batch()
+                self.batch = batch
+                self.inflight += 1
+                leader = True
+
+            batch.add(delete, data_blocks)
+            if self._is_full(batch):
+                self.cond.notify_all()
+
+            if not leader:
+                while not batch.done:
+                    self.cond.wait()
+
+                if batch.error:
+                    raise batch.error
+                return
+
+            # leader - wait for more writes
+            if self.policy.window > 0:
+                deadline = time.time() + self.policy.window
+                while not self._is_full(batch):
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.cond.wait(remaining)
+
+        # writes keep joining the batch until the previous batch is committed
+        with self.replica._get_lock():
+            with self.cond:
+                if self.batch is batch:
+                    self.batch = None
+                self.cond.notify_all()
+
+            try:
+                self._commit(batch)
+            except Exception, e:
+                batch.error = e
+
+        with self.cond:
+            batch.done = True
+            self.inflight -= 1
+            self.cond.notify_all()
+
+        if batch.error:
+            raise batch.error
+
+    def flush(self):
+        # wait until all batches are committed
+        with self.cond:
+            while self.inflight > 0:
+                self.cond.wait()
+
+    def _commit(self, batch):
+        repl = self.replica
+        repl.begin_transaction()
+        try:
+            for delete, data_blocks in batch.ops:
+                if delete:
+                    repl.delete_data_blocks(data_blocks)
+                else:
+                    repl.write_data_blocks(data_blocks)
+            repl.commit()
+        except Exception:
+            repl.rollback()
+            raise
+
+
 class replica(object):
     REPLICA_INCOMPLETE_SUFFIX = "part"
 
-    def __init__(self, fs, path, block_size):
+    def __init__(self, fs, path, block_size, policy=None):
         self.fs = fs
         self.data_path = path
         self.incomplete_path = replica.make_incomplete_path(path)
         self.block_size = block_size
         self.log = undo_log(fs, path)
         self.meta = meta_file(fs, path)
-        self.lock = threading.RLock()
+        self.lock = replica_locks.get_lock(path)
         self.transaction = False
         self.file_exist = False
+        # ids of blocks logged in the current transaction
+        self.logged_blocks = set()
+        # expected size of the data file, given by the writer
+        self.size_hint = 0
+        # bytes of the data file known to be allocated
+        self.preallocated = 0
+        # size of the data file in the current transaction
+        self.data_file_size = 0
+        self.committer = group_commit(self, policy)
 
         if self.fs.exists(self.data_path):
             self.file_exist = True
@@ -346,6 +958,10 @@ class replica(object):
                 self.file_exist = True
                 self.transaction = True
 
+        if not self.transaction and self.meta.is_clean():
+            # the undo log is removed before the replica is marked clean
+            self.log.set_empty()
+
     def _lock(self):
         self.lock.acquire()
 
@@ -355,6 +971,9 @@ class replica(object):
     def _get_lock(self):
         return self.lock
 
+    def _get_shared_lock(self):
+        return self.lock.shared()
+
     def _make_parent_dirs(self, path):
         with self._get_lock():
             parent_path = os.path.dirname(path)
@@ -377,8 +996,12 @@ class replica(object):
                 file_size = 0
 
             self.log.clear()
+            self.logged_blocks = set()
+            self.data_file_size = file_size
             size_log = undo_size_log(file_size)
             self.log.write_event_log(size_log, False)
+            # written with the first meta sync, before data is modified
+            self.meta.set_clean(False, False)
             self.transaction = True
 
     def commit(self):
@@ -387,8 +1010,12 @@ class replica(object):
                 raise IOError("not in transaction")
 
             self.log.clear()
+            self.meta.set_clean(True, False)
             self.meta.sync()
-            file_size = self.meta.get_data_file_size()
+            file_size = self._get_data_file_extent()
+            if file_size < self.data_file_size:
+                # space past the end is freed by shrinking
+                self.preallocated = min(self.preallocated, file_size)
             if file_size > 0:
                 self.fs.truncate(self.incomplete_path, file_size)
                 self.fs.rename(self.incomplete_path, self.data_path)
@@ -406,19 +1033,28 @@ class replica(object):
                 raise IOError("not in transaction")
 
             # roll-back
+            self.preallocated = 0
             block_logs = self.log.read_block_logs()
+            native_copy = self.fs.has_native_copy_range()
             data_blocks = []
+            copy_logs = []
             for block_log in block_logs:
                 # step1: copy old block back
-                dblock = data_block(
-                    block_log.id,
-                    block_log.version,
-                    block_log.data[:block_log.size]
-                )
-                data_blocks.append(dblock)
+                # an empty old block has nothing to copy back
+                if block_log.log_offset is not None and \
+                        (native_copy or block_log.data is None):
+                    # copy from the log within the backend
+                    copy_logs.append(block_log)
+                elif block_log.data:
+                    dblock = data_block(
+                        block_log.id,
+                        block_log.version,
+                        block_log.data[:block_log.size]
+                    )
+                    data_blocks.append(dblock)
 
                 # step2: copy old version back
-                if block_log.data:
+                if block_log.has_data():
                     flag = block_meta.META_FLAG_DATAIN
                 else:
                     flag = block_meta.META_FLAG_EMPTY
@@ -434,6 +1070,16 @@ class replica(object):
                     False
                 )
 
+            for block_log in copy_logs:
+                self.fs.copy_range(
+                    self.log.log_path,
+                    block_log.log_offset,
+                    self.incomplete_path,
+                    block_log.id * self.block_size,
+                    min(block_log.log_len, block_log.size)
+                )
+                self.file_exist = True
+
             if len(data_blocks) > 0:
                 self._write_data_blocks(data_blocks)
 
@@ -454,6 +1100,8 @@ class replica(object):
                     self.meta.clear()
                     self.file_exist = False
 
+            if self.file_exist:
+                self.meta.set_clean(True, False)
             self.meta.sync()
 
             # step3: remove log
@@ -470,28 +1118,51 @@ class replica(object):
                 raise IOError("not in transaction")
 
             # step1: copy an old block to log
+            # a block is logged only once in a transaction
+            # so roll-back restores the block before the transaction
             if self.file_exist:
+                log_dblocks = []
                 bmeta_arr = []
                 id_size_arr = []
                 for dblock in data_blocks:
+                    if dblock.id in self.logged_blocks:
+                        continue
+                    self.logged_blocks.add(dblock.id)
+
                     bmeta = self.meta.read_block_meta(dblock.id)
+                    log_dblocks.append(dblock)
                     bmeta_arr.append(bmeta)
                     id_size_arr.append((dblock.id, bmeta.size))
 
-                old_dblocks = self._read_data_blocks(id_size_arr)
+                # old blocks are copied to the log by the backend
+                # without reading them when it can do so natively
+                native_copy = self.fs.has_native_copy_range()
+                if not native_copy:
+                    old_dblocks = self._read_data_blocks(id_size_arr)
 
                 # write to log
                 # step2: make the block refer log
-                for i in xrange(0, len(data_blocks)):
-                    dblock = data_blocks[i]
+                for i in xrange(0, len(log_dblocks)):
+                    dblock = log_dblocks[i]
                     bmeta = bmeta_arr[i]
-                    old_dblock = old_dblocks[i]
 
-                    block_log = undo_block_log(
-                        dblock.id,
-                        old_dblock,
-                        bmeta.version,
-                        bmeta.size)
+                    if native_copy:
+                        source = None
+                        if bmeta.size > 0:
+                            source = (self.incomplete_path,
+                                      dblock.id * self.block_size)
+                        block_log = undo_block_log(
+                            dblock.id,
+                            None,
+                            bmeta.version,
+                            bmeta.size,
+                            source)
+                    else:
+                        block_log = undo_block_log(
+                            dblock.id,
+                            old_dblocks[i],
+                            bmeta.version,
+                            bmeta.size)
                     self.log.write_block_log(block_log, False)
 
                     new_block_meta = block_meta(
@@ -509,6 +1180,7 @@ class replica(object):
 
             # step3: overwrite data block
             if len(data_blocks) > 0:
+                self._preallocate(data_blocks)
                 self._write_data_blocks(data_blocks)
 
             # step4: set the version in the data file new version
@@ -525,13 +1197,18 @@ class replica(object):
 
     def fix_consistency(self):
         with self._get_lock():
+            if self.file_exist and not self.transaction and \
+                    self.meta.is_clean():
+                # the last transaction completed - nothing to recover
+                return
+
             if self.file_exist:
                 if self.transaction:
                     # fix by roll-back
                     self.rollback()
                 else:
                     self.meta.compact_block_meta(True)
-                    expected_file_size = self.meta.get_data_file_size()
+                    expected_file_size = self._get_data_file_extent()
                     st = self.fs.stat(self.data_path)
                     if expected_file_size != st.size:
                         # not good
@@ -540,6 +1217,9 @@ class replica(object):
             # clean up
             self.log.clear()
 
+            if self.file_exist:
+                self.meta.set_clean(True)
+
     def rename(self, new_path):
         with self._get_lock():
             if self.transaction:
@@ -554,63 +1234,118 @@ class replica(object):
                 # rename
                 if self.file_exist:
                     self.fs.rename(self.data_path, new_path)
+                replica_locks.rename(self.data_path, new_path)
                 self.data_path = new_path
                 self.incomplete_path = replica.make_incomplete_path(new_path)
                 self.meta.rename(new_path)
                 self.log.rename(new_path)
                 return True
 
-    def get_data_file_size(self):
+    def flush(self):
+        """
+        commit pending block writes and write back metadata
+        returns True if the replica is left consistent
+        """
+        self.committer.flush()
         with self._get_lock():
+            if self.transaction:
+                return False
+
+            self.meta.sync()
+            return True
+
+    def set_size_hint(self, size):
+        """
+        give the size the data file is expected to have, so it can be
+        allocated at once while blocks are written out of order
+        """
+        # only a hint, not serialized with transactions
+        self.size_hint = size
+
+    def get_meta_size(self):
+        return self.meta.get_meta_size()
+
+    def get_data_file_size(self):
+        with self._get_shared_lock():
             if self.transaction:
                 raise IOError("in transaction")
 
-            return self.meta.get_data_file_size()
+            return self._get_data_file_extent()
+
+    def _get_data_file_extent(self):
+        # blocks are not always written in order,
+        # so the file ends at the last block rather than the sum of sizes
+        block_len = self.meta.get_block_meta_len()
+        if block_len == 0:
+            return 0
+
+        last_bmeta = self.meta.read_block_meta(block_len - 1)
+        return (block_len - 1) * self.block_size + last_bmeta.size
 
     def get_data_block_len(self):
-        with self._get_lock():
+        with self._get_shared_lock():
             if self.transaction:
                 raise IOError("in transaction")
 
             return self.meta.get_block_meta_len()
 
     def read_data_blocks(self, data_blocks):
-        with self._get_lock():
+        with self._get_shared_lock():
             if self.transaction:
                 raise IOError("in transaction")
 
-            r_dblocks = []
+            id_size_arr = []
             for dblock in data_blocks:
                 bmeta = self.meta.read_block_meta(dblock.id)
                 # empty - default
-                r_dblock = data_block(
-                    dblock.id,
-                    dblock.version,
-                    None
-                )
-
+                data_size = 0
                 if bmeta.version == dblock.version:
                     # good to go
                     if self.file_exist:
-                        if bmeta.size > 0:
-                            block_data = self.fs.read(
-                                self.data_path,
-                                dblock.id * self.block_size,
-                                bmeta.size)
-                            r_dblock = data_block(
-                                dblock.id,
-                                dblock.version,
-                                block_data
-                            )
+                        data_size = bmeta.size
+                id_size_arr.append((dblock.id, data_size))
 
+            r_dblocks = []
+            block_datas = self._read_data_blocks(id_size_arr, self.data_path)
+            for i in xrange(0, len(data_blocks)):
+                dblock = data_blocks[i]
+                r_dblock = data_block(
+                    dblock.id,
+                    dblock.version,
+                    block_datas[i]
+                )
                 r_dblocks.append(r_dblock)
             return r_dblocks
 
+    def readinto_data_block(self, dblock, buf):
+        """
+        read a block into buf without allocating a new buffer
+        returns the size of the block or 0 if the block does not exist
+        """
+        with self._get_shared_lock():
+            if self.transaction:
+                raise IOError("in transaction")
+
+            bmeta = self.meta.read_block_meta(dblock.id)
+            if bmeta.version != dblock.version or bmeta.size == 0:
+                return 0
+
+            if not self.file_exist:
+                return 0
+
+            return self.fs.readinto(
+                self.data_path,
+                dblock.id * self.block_size,
+                memoryview(buf)[:bmeta.size])
+
     def delete_data_blocks(self, data_blocks):
         with self._get_lock():
             if not self.transaction:
                 raise IOError("not in transaction")
 
+            # the file may shrink
+            self.size_hint = 0
+
             if self.file_exist:
                 bmeta_arr = []
                 for dblock in data_blocks:
@@ -624,30 +1359,122 @@ class replica(object):
 
                 self.meta.sync()
 
-    def _read_data_blocks(self, id_size_arr):
-        #TODO: Need to make this funciton more efficient
-        data_blocks = []
-        for id_size in id_size_arr:
-            block_id, data_size = id_size
+    def _make_runs(self, blocks):
+        # group (block_id, size, ...) tuples sorted by id into runs
+        # that are contiguous in the data file
+        runs = []
+        run = []
+        run_bytes = 0
+        for block in blocks:
+            block_id, data_size = block[0], block[1]
+            if run:
+                last_id, last_size = run[-1][0], run[-1][1]
+                if (block_id != last_id + 1 or
+                        last_size != self.block_size or
+                        run_bytes + data_size > IO_COALESCE_MAX_BYTES):
+                    runs.append(run)
+                    run = []
+                    run_bytes = 0
+            run.append(block)
+            run_bytes += data_size
+
+        if run:
+            runs.append(run)
+        return runs
+
+    def _map_runs(self, func, runs):
+        # non-adjacent runs are independent ranges of the file
+        if len(runs) > 1 and self.fs.is_thread_safe():
+            return _get_io_pool().map(func, runs)
+        return map(func, runs)
+
+    def _read_data_blocks(self, id_size_arr, path=None):
+        if not path:
+            path = self.incomplete_path
+
+        blocks = []
+        for i in xrange(0, len(id_size_arr)):
+            block_id, data_size = id_size_arr[i]
             if data_size > 0:
-                block_data = self.fs.read(
-                    self.incomplete_path,
-                    block_id * self.block_size,
-                    data_size)
-            else:
-                block_data = None
-            data_blocks.append(block_data)
+                blocks.append((block_id, data_size, i))
+        blocks.sort()
+
+        def read_run(run):
+            first_id = run[0][0]
+            last_id, last_size = run[-1][0], run[-1][1]
+            buf = self.fs.read(
+                path,
+                first_id * self.block_size,
+                (last_id - first_id) * self.block_size + last_size)
+            if len(run) == 1:
+                return [buf]
+
+            # split into blocks without copying
+            view = memoryview(buf)
+            block_datas = []
+            for block_id, data_size, i in run:
+                start = (block_id - first_id) * self.block_size
+                block_datas.append(view[start:start + data_size])
+            return block_datas
+
+        data_blocks = [None] * len(id_size_arr)
+        runs = self._make_runs(blocks)
+        run_datas = self._map_runs(read_run, runs)
+        for r in xrange(0, len(runs)):
+            run = runs[r]
+            for j in xrange(0, len(run)):
+                data_blocks[run[j][2]] = run_datas[r][j]
         return data_blocks
 
+    def _preallocate(self, data_blocks):
+        # out-of-order block writes grow the file piece by piece, which
+        # fragments it unless the space is allocated up front
+        end = 0
+        for dblock in data_blocks:
+            if len(dblock.data) > 0:
+                end = max(end,
+                          dblock.id * self.block_size + len(dblock.data))
+
+        if end == 0:
+            # nothing is written, do not create the file
+            return
+
+        # the file grows to the end of the written blocks
+        self.data_file_size = max(self.data_file_size, end)
+        end = max(end, self.size_hint)
+        # the file already reaches that far
+        allocated = max(self.preallocated, self._get_data_file_extent())
+        if end > allocated:
+            self.fs.preallocate(self.incomplete_path, 0, end)
+            self.preallocated = end
+
     def _write_data_blocks(self, data_blocks):
-        #TODO: Need to make this funciton more efficient
+        # the last write of a block wins
+        latest_dblocks = {}
         for dblock in data_blocks:
             if dblock is not None and len(dblock.data) > 0:
-                self.fs.write(
-                    self.incomplete_path,
-                    dblock.id * self.block_size,
-                    dblock.data)
-                self.file_exist = True
+                latest_dblocks[dblock.id] = dblock
+
+        if not latest_dblocks:
+            return
+
+        blocks = []
+        for block_id in sorted(latest_dblocks.keys()):
+            dblock = latest_dblocks[block_id]
+            blocks.append((block_id, len(dblock.data), dblock))
+
+        def write_run(run):
+            if len(run) == 1:
+                buf = run[0][2].data
+            else:
+                buf = "".join([_to_bytes(block[2].data) for block in run])
+            self.fs.write(
+                self.incomplete_path,
+                run[0][0] * self.block_size,
+                buf)
+
+        self._map_runs(write_run, self._make_runs(blocks))
+        self.file_exist = True
 
     @classmethod
     def make_incomplete_path(self, path):
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import sys
+import threading
+
+
+class flight(object):
+    """
+    a call in progress and its outcome
+    """
+    def __init__(self, generation=None):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+        # generation of the caller that started the call
+        self.generation = generation
+
+
+class single_flight(object):
+    """
+    coalesces concurrent calls with the same key
+
+    The first caller of do() for a key runs the function. Callers that
+    come while it runs wait and get the same result or exception. A call
+    made after it finished runs the function again.
+
+    A caller of do_after() passing a generation newer than that of the
+    running call does not wait for it, but runs the function again.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, func, *args, **kwargs):
+        return self._do(key, None, func, args, kwargs)
+
+    def do_after(self, key, generation, func, *args, **kwargs):
+        return self._do(key, generation, func, args, kwargs)
+
+    def _do(self, key, generation, func, args, kwargs):
+        with self.lock:
+            f = self.flights.get(key)
+            if f is None or (generation is not None and
+                              f.generation < generation):
+                # the running call may not see changes of the caller
+                f = flight(generation)
+                self.flights[key] = f
+                leader = True
+                self.calls += 1
+            else:
+                leader = False
+                self.shared += 1
+
+        if leader:
+            try:
+                f.result = func(*args, **kwargs)
+            except Exception:
+                f.exc_info = sys.exc_info()
+            finally:
+                with self.lock:
+                    if self.flights.get(key) is f:
+                        del self.flights[key]
+                f.done.set()
+        else:
+            f.done.wait()
+
+        if f.exc_info:
+            raise f.exc_info[0], f.exc_info[1], f.exc_info[2]
+        return f.result
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "inflight": len(self.flights),
+                "calls": self.calls,
+                "shared": self.shared
+            }
+
+
+# guards generations of objects
+_generation_lock = threading.Lock()
+
+
+def _get_generation(obj):
+    return getattr(obj, "_flight_generation", 0)
+
+
+def _owns_lock(obj):
+    get_lock = getattr(obj, "_get_lock", None)
+    if get_lock is None:
+        return False
+
+    is_owned = getattr(get_lock(), "_is_owned", None)
+    return is_owned is not None and is_owned()
+
+
+def coalesced(func):
+    """
+    decorator coalescing concurrent calls of a method with the same
+    arguments on the same object
+
+    A thread already holding the lock of the object (from _get_lock) runs
+    the call by itself, as the thread running the call may be waiting
+    for that lock. A call does not join one started before a method
+    decorated with invalidates returned.
+    """
+    flights = single_flight()
+
+    def wrap(self, *args):
+        if _owns_lock(self):
+            return func(self, *args)
+        return flights.do_after((id(self),) + args, _get_generation(self),
+                                func, self, *args)
+
+    wrap.__name__ = func.__name__
+    wrap.__doc__ = func.__doc__
+    return wrap
+
+
+def invalidates(func):
+    """
+    decorator of a method changing what coalesced methods of the object
+    return
+
+    Coalesced calls made after it returns do not join calls started
+    before, which may not see the change.
+    """
+    def wrap(self, *args, **kwargs):
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            with _generation_lock:
+                self._flight_generation = _get_generation(self) + 1
+
+    wrap.__name__ = func.__name__
+    wrap.__doc__ = func.__doc__
+    return wrap
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import os
+import threading
+import cPickle as pickle
+
+INDEX_VERSION = 1
+
+
+def _make_entry(st):
+    return (bool(st.directory), st.size, st.modify_time, st.checksum)
+
+
+class publish_sem(object):
+    """
+    semaphore released once per processed command of a crawl, which
+    also records the paths of commands that failed
+    """
+    def __init__(self):
+        self.sem = threading.Semaphore(0)
+        self.lock = threading.Lock()
+        self.failed = set()
+
+    def acquire(self):
+        self.sem.acquire()
+
+    def release(self):
+        self.sem.release()
+
+    def fail(self, path):
+        with self.lock:
+            self.failed.add(path)
+        self.sem.release()
+
+    def get_failed(self):
+        with self.lock:
+            return set(self.failed)
+
+
+class sync_index(object):
+    """
+    snapshot of a dataset listing kept on local disk
+
+    An entry is (directory, size, modify time, checksum) of a path.
+    During a crawl, observe() tells whether an entry is new or changed
+    since the loaded snapshot, and get_removed() returns paths that were
+    not seen. save() writes what was seen as the next snapshot;
+    save_after() waits until the changes are published first, so a
+    restart in between crawls them again. Paths that failed to publish
+    keep their entries of the loaded snapshot, so the next crawl finds
+    them changed again. With scope, the crawl covers only the tree under
+    the scope directory and entries out of it are kept as they are.
+    """
+    def __init__(self, path, scope="/"):
+        self.path = path
+        self.scope = scope.rstrip("/") + "/"
+        self.lock = threading.Lock()
+        # snapshot loaded from disk
+        self.entries = {}
+        self.loaded = False
+        # entries seen during the current crawl
+        self.seen = {}
+        # directories that could not be listed
+        self.failed_dirs = []
+
+    def load(self):
+        self.entries = {}
+        self.loaded = False
+        if not os.path.exists(self.path):
+            return False
+
+        try:
+            with open(self.path, "rb") as f:
+                version, entries = pickle.load(f)
+        except Exception:
+            # treat a broken index as missing
+            return False
+
+        if version != INDEX_VERSION:
+            return False
+
+        self.entries = entries
+        self.loaded = True
+        return True
+
+    def save(self, failed=()):
+        with self.lock:
+            entries = dict(self.seen)
+            # keep what could not be listed this time
+            for path, entry in self.entries.iteritems():
+                if path in entries:
+                    continue
+                if not self._is_in_scope(path) or \
+                        self._is_under_failed_dir(path):
+                    entries[path] = entry
+
+            # what failed to publish is as in the loaded snapshot
+            for path in failed:
+                if path in self.entries:
+                    entries[path] = self.entries[path]
+                else:
+                    entries.pop(path, None)
+
+        parent = os.path.dirname(self.path)
+        if parent and not os.path.exists(parent):
+            os.makedirs(parent)
+
+        # write and rename, so a crash never leaves a partial index
+        tmp_path = "%s.tmp" % self.path
+        with open(tmp_path, "wb") as f:
+            pickle.dump((INDEX_VERSION, entries), f,
+                        pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, self.path)
+
+        with self.lock:
+            self.entries = entries
+            self.seen = {}
+            self.failed_dirs = []
+
+    def save_after(self, sem, count):
+        """
+        save once sem (a publish_sem) has been released count times,
+        once per queued command of the crawl
+        """
+        for _ in xrange(count):
+            sem.acquire()
+        self.save(sem.get_failed())
+
+    def observe(self, path, st):
+        """
+        record an entry found by the crawl and return "added", "updated"
+        or None if it has not changed
+        """
+        entry = _make_entry(st)
+        with self.lock:
+            self.seen[path] = entry
+            old_entry = self.entries.get(path)
+
+        if old_entry is None:
+            return "added"
+        if old_entry != entry:
+            return "updated"
+        return None
+
+    def fail_dir(self, path):
+        with self.lock:
+            self.failed_dirs.append(path.rstrip("/") + "/")
+
+    def _is_in_scope(self, path):
+        return path.startswith(self.scope)
+
+    def _is_under_failed_dir(self, path):
+        for dirpath in self.failed_dirs:
+            if path.startswith(dirpath):
+                return True
+        return False
+
+    def get_removed(self):
+        """
+        return paths in the snapshot not seen by the crawl, children first
+        """
+        with self.lock:
+            removed = []
+            for path in self.entries:
+                if path in self.seen:
+                    continue
+                if not self._is_in_scope(path):
+                    continue
+                if self._is_under_failed_dir(path):
+                    continue
+                removed.append(path)
+
+        removed.sort(key=len, reverse=True)
+        return removed
+
+    def __len__(self):
+        return len(self.entries)
@@ -173,6 +173,15 @@ class irods_client(object):
             except (CollectionDoesNotExist):
                 return None
 
+    """
+    Returns directory entries in irods_status
+    """
+    def list_dir_stat(self, path):
+        stats = self._ensureDirEntryStatLoaded(path)
+        if stats:
+            return list(stats)
+        return []
+
     """
     Returns directory entries in string
     """
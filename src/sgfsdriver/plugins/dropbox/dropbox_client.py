@@ -63,18 +63,18 @@ class dropbox_status(object):
 
     @classmethod
     def fromFolder(cls, col):
-        return irods_status(directory=True,
-                            path=col.path_display,
-                            name=col.name)
+        return cls(directory=True,
+                   path=col.path_display,
+                   name=col.name)
 
     @classmethod
     def fromFile(cls, obj):
-        return irods_status(directory=False,
-                            path=obj.path_display,
-                            name=obj.name,
-                            size=obj.size,
-                            checksum=obj.content_hash,
-                            modify_time=obj.server_modified)
+        return cls(directory=False,
+                   path=obj.path_display,
+                   name=obj.name,
+                   size=obj.size,
+                   checksum=obj.content_hash,
+                   modify_time=obj.server_modified)
 
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
@@ -188,6 +188,15 @@ class dropbox_client(object):
             except (dropbox.exception.ApiError):
                 return None
 
+    """
+    Returns directory entries in dropbox_status
+    """
+    def list_dir_stat(self, path):
+        stats = self._ensureDirEntryStatLoaded(path)
+        if stats:
+            return list(stats)
+        return []
+
     """
     Returns directory entries in string
     """
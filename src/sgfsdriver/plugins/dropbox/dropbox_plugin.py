@@ -23,6 +23,7 @@ import os
 import logging
 import threading
 import sgfsdriver.lib.abstractfs as abstractfs
+import sgfsdriver.lib.singleflight as singleflight
 import sgfsdriver.plugins.dropbox.dropbox_client as dropbox_client
 
 logger = logging.getLogger('syndicate_Dropbox_filesystem')
@@ -146,6 +147,7 @@ class plugin_impl(abstractfs.afsbase):
         if self.dropbox:
             self.dropbox.close()
 
+    @singleflight.coalesced
     @reconnectAtDropboxFail
     def stat(self, path):
         logger.info("stat - %s" % path)
@@ -167,6 +169,7 @@ class plugin_impl(abstractfs.afsbase):
             else:
                 return None
 
+    @singleflight.coalesced
     @reconnectAtDropboxFail
     def exists(self, path):
         logger.info("exists - %s" % path)
@@ -187,6 +190,27 @@ class plugin_impl(abstractfs.afsbase):
             l = self.dropbox.list_dir(dropbox_path)
             return l
 
+    @reconnectAtDropboxFail
+    def list_dir_stat(self, dirpath):
+        logger.info("list_dir_stat - %s" % dirpath)
+
+        with self._get_lock():
+            ascii_path = dirpath.encode('ascii', 'ignore')
+            dropbox_path = self._make_dropbox_path(ascii_path)
+            driver_dir = self._make_driver_path(dropbox_path)
+            stats = []
+            for sb in self.dropbox.list_dir_stat(dropbox_path):
+                driver_path = (driver_dir + "/" + sb.name).lstrip("/")
+                stats.append(
+                    abstractfs.afsstat(directory=sb.directory,
+                                       path=driver_path,
+                                       name=sb.name,
+                                       size=sb.size,
+                                       checksum=sb.checksum,
+                                       create_time=sb.create_time,
+                                       modify_time=sb.modify_time))
+            return stats
+
     @reconnectAtDropboxFail
     def is_dir(self, dirpath):
         logger.info("is_dir - %s" % dirpath)
@@ -197,6 +221,7 @@ class plugin_impl(abstractfs.afsbase):
             d = self.dropbox.is_dir(dropbox_path)
             return d
 
+    @singleflight.invalidates
     @reconnectAtDropboxFail
     def make_dirs(self, dirpath):
         logger.info("make_dirs - %s" % dirpath)
@@ -217,6 +242,7 @@ class plugin_impl(abstractfs.afsbase):
             buf = self.dropbox.read(dropbox_path, offset, size)
             return buf
 
+    @singleflight.invalidates
     @reconnectAtDropboxFail
     def write(self, filepath, offset, buf):
         logger.info("write - %s, %d, %d" % (filepath, offset, len(buf)))
@@ -226,6 +252,7 @@ class plugin_impl(abstractfs.afsbase):
             dropbox_path = self._make_dropbox_path(ascii_path)
             self.dropbox.write(dropbox_path, offset, buf)
 
+    @singleflight.invalidates
     @reconnectAtDropboxFail
     def truncate(self, filepath, size):
         logger.info("truncate - %s, %d" % (filepath, size))
@@ -235,6 +262,7 @@ class plugin_impl(abstractfs.afsbase):
             dropbox_path = self._make_dropbox_path(ascii_path)
             self.dropbox.truncate(dropbox_path, size)
 
+    @singleflight.invalidates
     @reconnectAtDropboxFail
     def clear_cache(self, path):
         logger.info("clear_cache - %s" % path)
@@ -247,6 +275,7 @@ class plugin_impl(abstractfs.afsbase):
             else:
                 self.dropbox.clear_stat_cache(None)
 
+    @singleflight.invalidates
     @reconnectAtDropboxFail
     def unlink(self, filepath):
         logger.info("unlink - %s" % filepath)
@@ -256,6 +285,7 @@ class plugin_impl(abstractfs.afsbase):
             dropbox_path = self._make_dropbox_path(ascii_path)
             self.dropbox.unlink(dropbox_path)
 
+    @singleflight.invalidates
     @reconnectAtDropboxFail
     def rename(self, filepath1, filepath2):
         logger.info("rename - %s to %s" % (filepath1, filepath2))
@@ -19,6 +19,8 @@
 import traceback
 import os
 import stat
+import time
+import calendar
 import logging
 import ftplib
 import ftputil
@@ -49,12 +51,16 @@ class ftp_status(object):
                  path=None,
                  name=None,
                  size=0,
-                 create_time=0):
+                 checksum=0,
+                 create_time=0,
+                 modify_time=0):
         self.directory = directory
         self.path = path
         self.name = name
         self.size = size
+        self.checksum = checksum
         self.create_time = create_time
+        self.modify_time = modify_time
 
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
@@ -91,6 +97,11 @@ class ftp_client(object):
             self.password = "anonymous@email.com"
 
         self.session = None
+        self.session_factory = None
+        # connection of our own for MLSD, opened on first use
+        self.mlsd_session = None
+        # cleared when the server rejects MLSD
+        self.mlsd_supported = True
 
     def connect(self):
         my_session_factory = ftputil.session.session_factory(
@@ -98,6 +109,7 @@ class ftp_client(object):
             port=self.port,
             debug_level=2
         )
+        self.session_factory = my_session_factory
 
         self.session = ftputil.FTPHost(
             self.host,
@@ -110,6 +122,12 @@ class ftp_client(object):
         self.session.stat_cache.enable()
 
     def close(self):
+        if self.mlsd_session:
+            try:
+                self.mlsd_session.quit()
+            except Exception:
+                self.mlsd_session.close()
+            self.mlsd_session = None
         self.session.close()
 
     def reconnect(self):
@@ -129,16 +147,98 @@ class ftp_client(object):
     def stat(self, path):
         try:
             sb = self.session.lstat(path)
-            return ftp_status(
-                directory=stat.S_ISDIR(sb.st_mode),
-                path=path,
-                name=os.path.basename(path),
-                size=sb.st_size,
-                create_time=sb.st_ctime
-            )
+            return self._make_status(path, sb)
         except Exception:
             return None
 
+    def _make_status(self, path, sb):
+        return ftp_status(
+            directory=stat.S_ISDIR(sb.st_mode),
+            path=path,
+            name=os.path.basename(path),
+            size=sb.st_size,
+            create_time=sb.st_ctime,
+            modify_time=sb.st_mtime
+        )
+
+    def _parse_mlsd_time(self, value):
+        # YYYYMMDDHHMMSS[.sss] in UTC
+        try:
+            return calendar.timegm(time.strptime(value[:14], "%Y%m%d%H%M%S"))
+        except ValueError:
+            return 0
+
+    def _get_mlsd_session(self):
+        # ftputil does not send MLSD nor expose its own connections
+        if not self.mlsd_session:
+            self.mlsd_session = self.session_factory(
+                self.host,
+                self.user,
+                self.password
+            )
+        return self.mlsd_session
+
+    def _list_dir_stat_mlsd(self, path):
+        lines = []
+        self._get_mlsd_session().retrlines("MLSD %s" % path, lines.append)
+
+        stats = []
+        for line in lines:
+            # fact=value;fact=value; name
+            facts_str, _, name = line.partition(" ")
+            facts = {}
+            for fact in facts_str.split(";"):
+                if "=" in fact:
+                    key, _, value = fact.partition("=")
+                    facts[key.lower()] = value
+
+            entry_type = facts.get("type", "").lower()
+            if entry_type in ["cdir", "pdir"] or name in [".", ".."]:
+                continue
+
+            directory = entry_type == "dir"
+            modify_time = self._parse_mlsd_time(facts.get("modify", ""))
+            create_time = modify_time
+            if "create" in facts:
+                create_time = self._parse_mlsd_time(facts["create"])
+
+            size = 0
+            if not directory:
+                size = int(facts.get("size", 0))
+
+            stats.append(ftp_status(
+                directory=directory,
+                path=path.rstrip("/") + "/" + name,
+                name=name,
+                size=size,
+                create_time=create_time,
+                modify_time=modify_time
+            ))
+        return stats
+
+    """
+    Returns directory entries in ftp_status
+    """
+    def list_dir_stat(self, path):
+        if self.mlsd_supported:
+            try:
+                return self._list_dir_stat_mlsd(path)
+            except ftplib.error_perm, e:
+                # 500/502: command not understood or not implemented
+                if not str(e).startswith("50"):
+                    raise
+                logger.info("list_dir_stat: MLSD is not supported")
+                self.mlsd_supported = False
+
+        # LIST results are kept in the stat cache of ftputil,
+        # so lstat of the entries does not go to the server again
+        stats = []
+        for name in self.session.listdir(path):
+            entry_path = path.rstrip("/") + "/" + name
+            stats.append(
+                self._make_status(entry_path, self.session.lstat(entry_path)))
+        return stats
+
     """
     Returns directory entries in string
     """
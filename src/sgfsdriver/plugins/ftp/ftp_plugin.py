@@ -23,6 +23,7 @@ import os
 import logging
 import threading
 import sgfsdriver.lib.abstractfs as abstractfs
+import sgfsdriver.lib.singleflight as singleflight
 import sgfsdriver.plugins.ftp.ftp_client as ftp_client
 
 logger = logging.getLogger('syndicate_ftp_filesystem')
@@ -168,6 +169,7 @@ class plugin_impl(abstractfs.afsbase):
         if self.ftp:
             self.ftp.close()
 
+    @singleflight.coalesced
     @reconnectAtFTPFail
     def stat(self, path):
         logger.info("stat - %s" % path)
@@ -189,6 +191,7 @@ class plugin_impl(abstractfs.afsbase):
             else:
                 return None
 
+    @singleflight.coalesced
     @reconnectAtFTPFail
     def exists(self, path):
         logger.info("exists - %s" % path)
@@ -209,6 +212,27 @@ class plugin_impl(abstractfs.afsbase):
             l = self.ftp.list_dir(ftp_path)
             return l
 
+    @reconnectAtFTPFail
+    def list_dir_stat(self, dirpath):
+        logger.info("list_dir_stat - %s" % dirpath)
+
+        with self._get_lock():
+            ascii_path = dirpath.encode('ascii', 'ignore')
+            ftp_path = self._make_ftp_path(ascii_path)
+            driver_dir = self._make_driver_path(ftp_path)
+            stats = []
+            for sb in self.ftp.list_dir_stat(ftp_path):
+                driver_path = driver_dir + "/" + sb.name
+                stats.append(
+                    abstractfs.afsstat(directory=sb.directory,
+                                       path=driver_path,
+                                       name=sb.name,
+                                       size=sb.size,
+                                       checksum=sb.checksum,
+                                       create_time=sb.create_time,
+                                       modify_time=sb.modify_time))
+            return stats
+
     @reconnectAtFTPFail
     def is_dir(self, dirpath):
         logger.info("is_dir - %s" % dirpath)
@@ -219,6 +243,7 @@ class plugin_impl(abstractfs.afsbase):
             d = self.ftp.is_dir(ftp_path)
             return d
 
+    @singleflight.invalidates
     @reconnectAtFTPFail
     def make_dirs(self, dirpath):
         logger.info("make_dirs - %s" % dirpath)
@@ -239,6 +264,7 @@ class plugin_impl(abstractfs.afsbase):
             buf = self.ftp.read(ftp_path, offset, size)
             return buf
 
+    @singleflight.invalidates
     @reconnectAtFTPFail
     def write(self, filepath, offset, buf):
         logger.info("write - %s, %d, %d" % (filepath, offset, len(buf)))
@@ -248,6 +274,7 @@ class plugin_impl(abstractfs.afsbase):
             ftp_path = self._make_ftp_path(ascii_path)
             self.ftp.write(ftp_path, offset, buf)
 
+    @singleflight.invalidates
     @reconnectAtFTPFail
     def truncate(self, filepath, size):
         logger.info("truncate - %s, %d" % (filepath, size))
@@ -257,6 +284,7 @@ class plugin_impl(abstractfs.afsbase):
             ftp_path = self._make_ftp_path(ascii_path)
             self.ftp.truncate(ftp_path, size)
 
+    @singleflight.invalidates
     @reconnectAtFTPFail
     def clear_cache(self, path):
         logger.info("clear_cache - %s" % path)
@@ -269,6 +297,7 @@ class plugin_impl(abstractfs.afsbase):
             else:
                 self.ftp.clear_stat_cache(None)
 
+    @singleflight.invalidates
     @reconnectAtFTPFail
     def unlink(self, filepath):
         logger.info("unlink - %s" % filepath)
@@ -278,6 +307,7 @@ class plugin_impl(abstractfs.afsbase):
             ftp_path = self._make_ftp_path(ascii_path)
             self.ftp.unlink(ftp_path)
 
+    @singleflight.invalidates
     @reconnectAtFTPFail
     def rename(self, filepath1, filepath2):
         logger.info("rename - %s to %s" % (filepath1, filepath2))
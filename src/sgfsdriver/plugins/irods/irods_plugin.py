@@ -23,6 +23,7 @@ import os
 import logging
 import threading
 import sgfsdriver.lib.abstractfs as abstractfs
+import sgfsdriver.lib.singleflight as singleflight
 import sgfsdriver.plugins.irods.irods_client as irods_client
 
 logger = logging.getLogger('syndicate_iRODS_filesystem')
@@ -172,6 +173,7 @@ class plugin_impl(abstractfs.afsbase):
         if self.irods:
             self.irods.close()
 
+    @singleflight.coalesced
     @reconnectAtIRODSFail
     def stat(self, path):
         logger.info("stat - %s" % path)
@@ -193,6 +195,7 @@ class plugin_impl(abstractfs.afsbase):
             else:
                 return None
 
+    @singleflight.coalesced
     @reconnectAtIRODSFail
     def exists(self, path):
         logger.info("exists - %s" % path)
@@ -213,6 +216,27 @@ class plugin_impl(abstractfs.afsbase):
             l = self.irods.list_dir(irods_path)
             return l
 
+    @reconnectAtIRODSFail
+    def list_dir_stat(self, dirpath):
+        logger.info("list_dir_stat - %s" % dirpath)
+
+        with self._get_lock():
+            ascii_path = dirpath.encode('ascii', 'ignore')
+            irods_path = self._make_irods_path(ascii_path)
+            driver_dir = self._make_driver_path(irods_path)
+            stats = []
+            for sb in self.irods.list_dir_stat(irods_path):
+                driver_path = driver_dir + "/" + sb.name
+                stats.append(
+                    abstractfs.afsstat(directory=sb.directory,
+                                       path=driver_path,
+                                       name=sb.name,
+                                       size=sb.size,
+                                       checksum=sb.checksum,
+                                       create_time=sb.create_time,
+                                       modify_time=sb.modify_time))
+            return stats
+
     @reconnectAtIRODSFail
     def is_dir(self, dirpath):
         logger.info("is_dir - %s" % dirpath)
@@ -223,6 +247,7 @@ class plugin_impl(abstractfs.afsbase):
             d = self.irods.is_dir(irods_path)
             return d
 
+    @singleflight.invalidates
     @reconnectAtIRODSFail
     def make_dirs(self, dirpath):
         logger.info("make_dirs - %s" % dirpath)
@@ -243,6 +268,7 @@ class plugin_impl(abstractfs.afsbase):
             buf = self.irods.read(irods_path, offset, size)
             return buf
 
+    @singleflight.invalidates
     @reconnectAtIRODSFail
     def write(self, filepath, offset, buf):
         logger.info("write - %s, %d, %d" % (filepath, offset, len(buf)))
@@ -252,6 +278,7 @@ class plugin_impl(abstractfs.afsbase):
             irods_path = self._make_irods_path(ascii_path)
             self.irods.write(irods_path, offset, buf)
 
+    @singleflight.invalidates
     @reconnectAtIRODSFail
     def truncate(self, filepath, size):
         logger.info("truncate - %s, %d" % (filepath, size))
@@ -261,6 +288,7 @@ class plugin_impl(abstractfs.afsbase):
             irods_path = self._make_irods_path(ascii_path)
             self.irods.truncate(irods_path, size)
 
+    @singleflight.invalidates
     @reconnectAtIRODSFail
     def clear_cache(self, path):
         logger.info("clear_cache - %s" % path)
@@ -273,6 +301,7 @@ class plugin_impl(abstractfs.afsbase):
             else:
                 self.irods.clear_stat_cache(None)
 
+    @singleflight.invalidates
     @reconnectAtIRODSFail
     def unlink(self, filepath):
         logger.info("unlink - %s" % filepath)
@@ -282,6 +311,7 @@ class plugin_impl(abstractfs.afsbase):
             irods_path = self._make_irods_path(ascii_path)
             self.irods.unlink(irods_path)
 
+    @singleflight.invalidates
     @reconnectAtIRODSFail
     def rename(self, filepath1, filepath2):
         logger.info("rename - %s to %s" % (filepath1, filepath2))
@@ -20,14 +20,26 @@
 Local-filesystem Plugin
 """
 import os
+import errno
+import time
+import threading
+import traceback
 import xattr
 import stat
 import logging
-import threading
 import pyinotify
 
+from collections import deque
+
 
 import sgfsdriver.lib.abstractfs as abstractfs
+import sgfsdriver.lib.singleflight as singleflight
+import sgfsdriver.lib.eventdebouncer as eventdebouncer
+import sgfsdriver.lib.lockmanager as lockmanager
+import sgfsdriver.lib.fileops as fileops
+
+from sgfsdriver.lib.fdcache import fd_cache
+from sgfsdriver.lib.mmapcache import mmap_cache
 
 logger = logging.getLogger('syndicate_local_filesystem')
 logger.setLevel(logging.DEBUG)
@@ -41,6 +53,37 @@ fh.setFormatter(formatter)
 # add the handlers to the logger
 logger.addHandler(fh)
 
+DEFAULT_NOTIFICATION_WINDOW = 1.0     # 1 sec
+DEFAULT_NOTIFICATION_MAX_DELAY = 30.0     # 30 sec
+MAX_USER_WATCHES_PATH = "/proc/sys/fs/inotify/max_user_watches"
+DEFAULT_MAX_USER_WATCHES = 8192
+# share of max_user_watches used, leave some to other processes
+WATCH_LIMIT_RATIO = 0.9
+WATCH_STATS_INTERVAL = 60     # 60 sec
+
+WATCH_MASK = (pyinotify.IN_DELETE | pyinotify.IN_CREATE |
+              pyinotify.IN_MODIFY | pyinotify.IN_CLOSE_WRITE |
+              pyinotify.IN_ATTRIB |
+              pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO |
+              pyinotify.IN_MOVE_SELF)
+
+DEFAULT_FD_CACHE_SIZE = 64
+DEFAULT_FD_CACHE_TTL = 5     # 5 sec
+DEFAULT_MMAP_CACHE_SIZE = 64
+# bytes copied at once when the kernel cannot copy
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# available from python 3.5
+os_scandir = getattr(os, "scandir", None)
+
+
+def _get_max_user_watches():
+    try:
+        with open(MAX_USER_WATCHES_PATH) as f:
+            return int(f.read().strip())
+    except (IOError, ValueError):
+        return DEFAULT_MAX_USER_WATCHES
+
 
 class InotifyEventHandler(pyinotify.ProcessEvent):
     def __init__(self, plugin):
@@ -49,15 +92,24 @@ class InotifyEventHandler(pyinotify.ProcessEvent):
     def process_IN_CREATE(self, event):
         logger.info("Creating: %s" % event.pathname)
         self.plugin.on_update_detected("create", event.pathname)
+        if event.dir:
+            self.plugin.on_dir_created(event.pathname)
 
     def process_IN_DELETE(self, event):
         logger.info("Removing: %s" % event.pathname)
         self.plugin.on_update_detected("remove", event.pathname)
+        if event.dir:
+            self.plugin.on_dir_removed(event.pathname)
 
     def process_IN_MODIFY(self, event):
         logger.info("Modifying: %s" % event.pathname)
         self.plugin.on_update_detected("modify", event.pathname)
 
+    def process_IN_CLOSE_WRITE(self, event):
+        # writing is done, no need to wait for more modifications
+        logger.info("Closing a written file: %s" % event.pathname)
+        self.plugin.on_update_detected("modify", event.pathname, True)
+
     def process_IN_ATTRIB(self, event):
         logger.info("Modifying attributes: %s" % event.pathname)
         self.plugin.on_update_detected("modify", event.pathname)
@@ -65,10 +117,18 @@ class InotifyEventHandler(pyinotify.ProcessEvent):
     def process_IN_MOVED_FROM(self, event):
         logger.info("Moving a file from : %s" % event.pathname)
         self.plugin.on_update_detected("remove", event.pathname)
+        if event.dir:
+            self.plugin.on_dir_removed(event.pathname, True)
 
     def process_IN_MOVED_TO(self, event):
         logger.info("Moving a file to : %s" % event.pathname)
         self.plugin.on_update_detected("create", event.pathname)
+        if event.dir:
+            self.plugin.on_dir_created(event.pathname)
+
+    def process_IN_Q_OVERFLOW(self, event):
+        logger.info("Event queue overflowed")
+        self.plugin.on_overflow()
 
     def process_default(self, event):
         logger.info("Unhandled event to a file : %s" % event.pathname)
@@ -99,10 +159,60 @@ class plugin_impl(abstractfs.afsbase):
             self.notify_handler = InotifyEventHandler(self)
             self.notifier = pyinotify.ThreadedNotifier(self.watch_manager,
                                                        self.notify_handler)
+            # events are coalesced per path and delivered in batches
+            self.debouncer = eventdebouncer.event_debouncer(
+                self._on_updates_detected,
+                window=float(config.get("notification_window",
+                                        DEFAULT_NOTIFICATION_WINDOW)),
+                max_delay=float(config.get("notification_max_delay",
+                                           DEFAULT_NOTIFICATION_MAX_DELAY)),
+                on_error=self._on_updates_failed)
+
+            # directories are watched one by one in the background
+            max_watches = config.get("max_watches")
+            if not max_watches:
+                max_watches = int(_get_max_user_watches() *
+                                  WATCH_LIMIT_RATIO)
+            self.max_watches = int(max_watches)
+            self.running = False
+            self.watch_cond = threading.Condition(threading.Lock())
+            # localfs path -> watch descriptor
+            self.watches = {}
+            # (localfs path, new) of directories to watch
+            self.watch_queue = deque()
+            self.watch_thread = None
+            # directories not watched due to max_watches
+            self.unwatched = 0
+
+            # directory trees to resync as events are lost
+            self.resync_cond = threading.Condition(threading.Lock())
+            self.resync_path = None
+            self.resync_thread = None
+            self.overflows = 0
+            self.resyncs = 0
 
         self.notification_cb = None
-        # create a re-entrant lock (not a read lock)
-        self.lock = threading.RLock()
+        self.resync_cb = None
+        # open files reused by reads and writes
+        self.fds = fd_cache(
+            max_len=int(config.get("fd_cache_size", DEFAULT_FD_CACHE_SIZE)),
+            ttl=float(config.get("fd_cache_ttl", DEFAULT_FD_CACHE_TTL)))
+        # files mapped for reads, only for files that do not shrink
+        # while being read
+        self.maps = None
+        if config.get("mmap_read"):
+            self.maps = mmap_cache(
+                max_len=int(config.get("mmap_cache_size",
+                                       DEFAULT_MMAP_CACHE_SIZE)),
+                ttl=float(config.get("fd_cache_ttl", DEFAULT_FD_CACHE_TTL)))
+        # turned off when the kernel refuses them
+        self.copy_file_range_supported = fileops.has_copy_file_range()
+        self.sendfile_supported = fileops.has_sendfile()
+        self.fallocate_supported = fileops.has_fallocate() and \
+            bool(config.get("preallocate", True))
+        # operations are independent os calls on paths
+        # so they do not need to be serialized
+        self.lock = lockmanager.null_lock()
 
     def _lock(self):
         self.lock.acquire()
@@ -113,25 +223,192 @@ class plugin_impl(abstractfs.afsbase):
     def _get_lock(self):
         return self.lock
 
-    def on_update_detected(self, operation, path):
+    def _invalidate_open_files(self, localfs_path):
+        self.fds.invalidate(localfs_path)
+        if self.maps is not None:
+            self.maps.invalidate(localfs_path)
+
+    def on_update_detected(self, operation, path, urgent=False):
         logger.info("on_update_detected - %s, %s" % (operation, path))
 
         ascii_path = path.encode('ascii', 'ignore')
         driver_path = self._make_driver_path(ascii_path)
+        if operation != "modify":
+            # the path may refer to another file now
+            self._invalidate_open_files(self._make_localfs_path(ascii_path))
+        self.debouncer.add(operation, driver_path, urgent)
+
+    def on_overflow(self):
+        # the kernel does not tell which events were lost, so the whole
+        # watched tree is resynced
+        logger.info("on_overflow - resync /")
+
+        with self.resync_cond:
+            self.overflows += 1
+            self.resync_path = "/"
+            self.resync_cond.notify()
+
+    def _run_resyncs(self):
+        while True:
+            with self.resync_cond:
+                while self.running and self.resync_path is None:
+                    self.resync_cond.wait()
+                if not self.running:
+                    return
+                dirpath = self.resync_path
+                self.resync_path = None
+
+            if not self.resync_cb:
+                logger.error("events under %s are lost" % dirpath)
+                continue
+
+            logger.info("resync - %s" % dirpath)
+            try:
+                self.resync_cb(dirpath)
+            except Exception:
+                logger.error("_run_resyncs: " + traceback.format_exc())
+
+            with self.resync_cond:
+                self.resyncs += 1
 
-        self.clear_cache(driver_path)
-        if operation == "remove":
-            if self.notification_cb:
-                entry = abstractfs.afsevent(driver_path, None)
-                self.notification_cb([], [], [entry])
-        elif operation in ["create", "modify"]:
-            if self.notification_cb:
-                st = self.stat(driver_path)
-                entry = abstractfs.afsevent(driver_path, st)
-                if operation == "create":
-                    self.notification_cb([], [entry], [])
-                elif operation == "modify":
-                    self.notification_cb([entry], [], [])
+    def on_dir_created(self, path):
+        ascii_path = path.encode('ascii', 'ignore')
+        with self.watch_cond:
+            # entries may be created before the watch is set
+            self.watch_queue.append((ascii_path, True))
+            self.watch_cond.notify()
+
+    def on_dir_removed(self, path, moved=False):
+        ascii_path = path.encode('ascii', 'ignore')
+        with self.watch_cond:
+            if not moved:
+                # removed directories lose their watches, subdirectories
+                # are removed (and notified) first
+                self.watches.pop(ascii_path, None)
+                return
+
+            # a moved directory keeps its watches under a stale path
+            prefix = ascii_path + "/"
+            wds = []
+            for dirpath in self.watches.keys():
+                if dirpath == ascii_path or dirpath.startswith(prefix):
+                    wds.append(self.watches.pop(dirpath))
+
+        if wds:
+            self.watch_manager.rm_watch(wds, quiet=True)
+
+    def _list_dir_entries(self, localfs_path):
+        # returns names of entries and sub-directories, not following
+        # symbolic links
+        names = os.listdir(localfs_path)
+        subdirs = []
+        for name in names:
+            try:
+                sb = os.lstat(os.path.join(localfs_path, name))
+            except OSError:
+                # removed while listing
+                continue
+            if stat.S_ISDIR(sb.st_mode):
+                subdirs.append(name)
+        return names, subdirs
+
+    def _add_watch(self, localfs_path, new):
+        with self.watch_cond:
+            if localfs_path in self.watches:
+                return
+            if len(self.watches) >= self.max_watches:
+                if self.unwatched == 0:
+                    logger.error(
+                        "reached max_watches (%d), changes under %s "
+                        "are not detected" %
+                        (self.max_watches, localfs_path))
+                self.unwatched += 1
+                return
+
+            wdd = self.watch_manager.add_watch(localfs_path, WATCH_MASK,
+                                               rec=False, auto_add=False,
+                                               quiet=True)
+            wd = wdd.get(localfs_path, -1)
+            if wd < 0:
+                logger.error("failed to watch %s" % localfs_path)
+                return
+            self.watches[localfs_path] = wd
+
+        try:
+            names, subdirs = self._list_dir_entries(localfs_path)
+        except OSError:
+            # removed after the watch is set
+            return
+
+        if new:
+            for name in names:
+                self.on_update_detected("create",
+                                        os.path.join(localfs_path, name))
+
+        with self.watch_cond:
+            for name in subdirs:
+                self.watch_queue.append(
+                    (os.path.join(localfs_path, name), new))
+
+    def _run_watches(self):
+        last_report = time.time()
+        while True:
+            with self.watch_cond:
+                while self.running and not self.watch_queue:
+                    self.watch_cond.wait(WATCH_STATS_INTERVAL)
+                    if not self.watch_queue:
+                        break
+                if not self.running:
+                    return
+                item = None
+                if self.watch_queue:
+                    item = self.watch_queue.popleft()
+
+            if item:
+                try:
+                    self._add_watch(*item)
+                except Exception:
+                    logger.error("_run_watches: " + traceback.format_exc())
+
+            now = time.time()
+            if now - last_report >= WATCH_STATS_INTERVAL:
+                logger.info("watch stats - %r" % self.get_stats())
+                last_report = now
+
+    def _on_updates_detected(self, events):
+        logger.info("_on_updates_detected - %d events" % len(events))
+
+        updated = []
+        added = []
+        removed = []
+        for operation, driver_path in events:
+            self.clear_cache(driver_path)
+            if operation in ["create", "modify"]:
+                try:
+                    st = self.stat(driver_path)
+                except OSError:
+                    # removed after the event
+                    operation = "remove"
+                else:
+                    entry = abstractfs.afsevent(driver_path, st)
+                    if operation == "create":
+                        added.append(entry)
+                    else:
+                        updated.append(entry)
+
+            if operation == "remove":
+                removed.append(abstractfs.afsevent(driver_path, None))
+
+        if self.notification_cb:
+            try:
+                self.notification_cb(updated, added, removed)
+            except Exception:
+                logger.error("_on_updates_detected: " +
+                             traceback.format_exc())
+
+    def _on_updates_failed(self, events):
+        logger.error("_on_updates_detected: %d events are lost: %s" %
+                     (len(events), traceback.format_exc()))
 
     def _make_localfs_path(self, path):
         if path.startswith(self.work_root):
@@ -159,17 +436,20 @@ class plugin_impl(abstractfs.afsbase):
 
             try:
                 # start monitoring
+                self.debouncer.start()
                 self.notifier.start()
 
-                mask = (pyinotify.IN_DELETE | pyinotify.IN_CREATE |
-                        pyinotify.IN_MODIFY | pyinotify.IN_ATTRIB |
-                        pyinotify.IN_MOVED_FROM | pyinotify.IN_MOVED_TO |
-                        pyinotify.IN_MOVE_SELF)
-                self.watch_directory = self.watch_manager.add_watch(
-                    self.work_root,
-                    mask,
-                    rec=True,
-                    auto_add=True)
+                self.running = True
+                self.watch_queue.append((self.work_root, False))
+                self.watch_thread = threading.Thread(
+                    target=self._run_watches)
+                self.watch_thread.daemon = True
+                self.watch_thread.start()
+
+                self.resync_thread = threading.Thread(
+                    target=self._run_resyncs)
+                self.resync_thread.daemon = True
+                self.resync_thread.start()
             except:
                 self.close()
 
@@ -177,12 +457,35 @@ class plugin_impl(abstractfs.afsbase):
         logger.info("close")
 
         if self._role == abstractfs.afsrole.DISCOVER:
-            if self.watch_manager and self.watch_directory:
-                self.watch_manager.rm_watch(self.watch_directory.values())
+            with self.watch_cond:
+                self.running = False
+                self.watch_cond.notify()
+            with self.resync_cond:
+                self.resync_cond.notify()
+
+            for thread in [self.watch_thread, self.resync_thread]:
+                if thread:
+                    thread.join()
+            self.watch_thread = None
+            self.resync_thread = None
+
+            with self.watch_cond:
+                wds = self.watches.values()
+                self.watches.clear()
+                self.watch_queue.clear()
+            if self.watch_manager and wds:
+                self.watch_manager.rm_watch(wds, quiet=True)
 
             if self.notifier:
                 self.notifier.stop()
 
+            self.debouncer.stop()
+
+        self.fds.clear()
+        if self.maps is not None:
+            self.maps.clear()
+
+    @singleflight.coalesced
     def stat(self, path):
         logger.info("stat - %s" % path)
 
@@ -192,15 +495,9 @@ class plugin_impl(abstractfs.afsbase):
             driver_path = self._make_driver_path(ascii_path)
             # get stat
             sb = os.stat(localfs_path)
-            return abstractfs.afsstat(
-                directory=stat.S_ISDIR(sb.st_mode),
-                path=driver_path,
-                name=os.path.basename(driver_path),
-                size=sb.st_size,
-                checksum=0,
-                create_time=sb.st_ctime,
-                modify_time=sb.st_mtime)
+            return self._make_stat(driver_path, sb)
 
+    @singleflight.coalesced
     def exists(self, path):
         logger.info("exists - %s" % path)
 
@@ -219,6 +516,52 @@ class plugin_impl(abstractfs.afsbase):
             l = os.listdir(localfs_path)
             return l
 
+    def _make_stat(self, driver_path, sb):
+        return abstractfs.afsstat(
+            directory=stat.S_ISDIR(sb.st_mode),
+            path=driver_path,
+            name=os.path.basename(driver_path),
+            size=sb.st_size,
+            checksum=0,
+            create_time=sb.st_ctime,
+            modify_time=sb.st_mtime)
+
+    def _list_dir_stat_raw(self, localfs_path):
+        # returns (name, os.stat_result) of entries
+        if os_scandir:
+            l = []
+            for entry in os_scandir(localfs_path):
+                try:
+                    l.append((entry.name, entry.stat()))
+                except OSError as e:
+                    # removed while listing
+                    if e.errno != errno.ENOENT:
+                        raise
+            return l
+
+        l = []
+        for name in os.listdir(localfs_path):
+            try:
+                l.append((name, os.stat(os.path.join(localfs_path, name))))
+            except OSError as e:
+                # removed while listing
+                if e.errno != errno.ENOENT:
+                    raise
+        return l
+
+    def list_dir_stat(self, dirpath):
+        logger.info("list_dir_stat - %s" % dirpath)
+
+        with self._get_lock():
+            ascii_path = dirpath.encode('ascii', 'ignore')
+            localfs_path = self._make_localfs_path(ascii_path)
+            driver_dir = self._make_driver_path(localfs_path)
+            stats = []
+            for name, sb in self._list_dir_stat_raw(localfs_path):
+                driver_path = driver_dir + "/" + name
+                stats.append(self._make_stat(driver_path, sb))
+            return stats
+
     def is_dir(self, dirpath):
         logger.info("is_dir - %s" % dirpath)
 
@@ -231,6 +574,7 @@ class plugin_impl(abstractfs.afsbase):
                 d = stat.S_ISDIR(sb.st_mode)
             return d
 
+    @singleflight.invalidates
     def make_dirs(self, dirpath):
         logger.info("make_dirs - %s" % dirpath)
 
@@ -238,7 +582,12 @@ class plugin_impl(abstractfs.afsbase):
             ascii_path = dirpath.encode('ascii', 'ignore')
             localfs_path = self._make_localfs_path(ascii_path)
             if not os.path.exists(localfs_path):
-                os.makedirs(localfs_path)
+                try:
+                    os.makedirs(localfs_path)
+                except OSError, e:
+                    # created by another thread
+                    if e.errno != errno.EEXIST:
+                        raise e
 
     def read(self, filepath, offset, size):
         logger.info("read - %s, %d, %d" % (filepath, offset, size))
@@ -246,35 +595,162 @@ class plugin_impl(abstractfs.afsbase):
         with self._get_lock():
             ascii_path = filepath.encode('ascii', 'ignore')
             localfs_path = self._make_localfs_path(ascii_path)
-            with open(localfs_path, "r") as f:
-                f.seek(offset, 0)
-                buf = f.read(size)
-            return buf
+            if self.maps is not None:
+                return str(self.maps.read_buffer(localfs_path, offset,
+                                                 size))
+
+            with self.fds.open(localfs_path, os.O_RDONLY) as f:
+                return f.pread(size, offset)
+
+    def read_buffer(self, filepath, offset, size):
+        if self.maps is None:
+            return None
+
+        logger.info("read_buffer - %s, %d, %d" % (filepath, offset, size))
+
+        with self._get_lock():
+            ascii_path = filepath.encode('ascii', 'ignore')
+            localfs_path = self._make_localfs_path(ascii_path)
+            return self.maps.read_buffer(localfs_path, offset, size)
+
+    def has_native_readinto(self):
+        return True
+
+    def readinto(self, filepath, offset, buf):
+        logger.info("readinto - %s, %d, %d" % (filepath, offset, len(buf)))
+
+        with self._get_lock():
+            ascii_path = filepath.encode('ascii', 'ignore')
+            localfs_path = self._make_localfs_path(ascii_path)
+            with self.fds.open(localfs_path, os.O_RDONLY) as f:
+                return f.preadinto(buf, offset)
 
+    @singleflight.invalidates
     def write(self, filepath, offset, buf):
         logger.info("write - %s, %d, %d" % (filepath, offset, len(buf)))
 
         with self._get_lock():
             ascii_path = filepath.encode('ascii', 'ignore')
             localfs_path = self._make_localfs_path(ascii_path)
-            fd = os.open(localfs_path, os.O_WRONLY | os.O_CREAT)
-            os.lseek(fd, offset, os.SEEK_SET)
-            os.write(fd, buf)
-            os.close(fd)
+            with self.fds.open(localfs_path,
+                               os.O_WRONLY | os.O_CREAT) as f:
+                f.pwrite(buf, offset)
 
+    def _kernel_copy(self, src, src_offset, dst, dst_offset, size):
+        # returns bytes copied, None if the kernel cannot copy
+        if self.copy_file_range_supported:
+            try:
+                return fileops.copy_file_range(src.fd, src_offset, dst.fd,
+                                               dst_offset, size)
+            except OSError as e:
+                if e.errno not in fileops.UNSUPPORTED_ERRNOS:
+                    raise
+                self.copy_file_range_supported = False
+
+        if self.sendfile_supported:
+            try:
+                # sendfile writes at the offset of the descriptor
+                with dst.lock:
+                    os.lseek(dst.fd, dst_offset, os.SEEK_SET)
+                    return fileops.sendfile(dst.fd, src.fd, src_offset,
+                                            size)
+            except OSError as e:
+                if e.errno not in fileops.UNSUPPORTED_ERRNOS:
+                    raise
+                self.sendfile_supported = False
+        return None
+
+    @singleflight.invalidates
+    def copy_range(self, src_path, src_offset, dst_path, dst_offset, size):
+        logger.info("copy_range - %s, %d to %s, %d, %d" %
+                    (src_path, src_offset, dst_path, dst_offset, size))
+
+        with self._get_lock():
+            ascii_path1 = src_path.encode('ascii', 'ignore')
+            ascii_path2 = dst_path.encode('ascii', 'ignore')
+            localfs_path1 = self._make_localfs_path(ascii_path1)
+            localfs_path2 = self._make_localfs_path(ascii_path2)
+            with self.fds.open(localfs_path1, os.O_RDONLY) as src:
+                with self.fds.open(localfs_path2,
+                                   os.O_WRONLY | os.O_CREAT) as dst:
+                    copied = 0
+                    while copied < size:
+                        n = self._kernel_copy(src, src_offset + copied,
+                                              dst, dst_offset + copied,
+                                              size - copied)
+                        if n is None:
+                            # copy in userspace
+                            buf = src.pread(
+                                min(size - copied, COPY_CHUNK_SIZE),
+                                src_offset + copied)
+                            dst.pwrite(buf, dst_offset + copied)
+                            n = len(buf)
+
+                        if n == 0:
+                            # end of the source
+                            break
+                        copied += n
+                    return copied
+
+    def has_native_copy_range(self):
+        return self.copy_file_range_supported or self.sendfile_supported
+
+    def _fallocate(self, f, mode, offset, size):
+        # returns False if the file system cannot allocate
+        if not self.fallocate_supported:
+            return False
+
+        try:
+            return bool(fileops.fallocate(f.fd, mode, offset, size))
+        except OSError as e:
+            if e.errno not in fileops.UNSUPPORTED_ERRNOS:
+                raise
+            self.fallocate_supported = False
+            return False
+
+    def preallocate(self, filepath, offset, size):
+        logger.info("preallocate - %s, %d, %d" % (filepath, offset, size))
+
+        if not self.fallocate_supported or size <= 0:
+            return
+
+        with self._get_lock():
+            ascii_path = filepath.encode('ascii', 'ignore')
+            localfs_path = self._make_localfs_path(ascii_path)
+            with self.fds.open(localfs_path,
+                               os.O_WRONLY | os.O_CREAT) as f:
+                # the size of the file is not changed, so space past
+                # the end is not visible to readers
+                self._fallocate(f, fileops.FALLOC_FL_KEEP_SIZE, offset,
+                                size)
+
+    @singleflight.invalidates
     def truncate(self, filepath, size):
         logger.info("truncate - %s, %d" % (filepath, size))
 
         with self._get_lock():
             ascii_path = filepath.encode('ascii', 'ignore')
             localfs_path = self._make_localfs_path(ascii_path)
-            fd = os.open(localfs_path, os.O_WRONLY | os.O_CREAT)
-            os.ftruncate(fd, size)
-            os.close(fd)
-
+            with self.fds.open(localfs_path,
+                               os.O_WRONLY | os.O_CREAT) as f:
+                st = os.fstat(f.fd)
+                if size == st.st_size:
+                    # keep space preallocated past the end
+                    return
+
+                # shrinking frees preallocated space past the end too
+                os.ftruncate(f.fd, size)
+            if self.maps is not None:
+                self.maps.invalidate(localfs_path)
+
+    @singleflight.invalidates
     def clear_cache(self, path):
         logger.info("clear_cache - %s" % path)
 
+        ascii_path = path.encode('ascii', 'ignore')
+        self._invalidate_open_files(self._make_localfs_path(ascii_path))
+
+    @singleflight.invalidates
     def unlink(self, filepath):
         logger.info("unlink - %s" % filepath)
 
@@ -282,7 +758,9 @@ class plugin_impl(abstractfs.afsbase):
             ascii_path = filepath.encode('ascii', 'ignore')
             localfs_path = self._make_localfs_path(ascii_path)
             os.unlink(localfs_path)
+            self._invalidate_open_files(localfs_path)
 
+    @singleflight.invalidates
     def rename(self, filepath1, filepath2):
         logger.info("rename - %s to %s" % (filepath1, filepath2))
 
@@ -292,6 +770,8 @@ class plugin_impl(abstractfs.afsbase):
             localfs_path1 = self._make_localfs_path(ascii_path1)
             localfs_path2 = self._make_localfs_path(ascii_path2)
             os.rename(localfs_path1, localfs_path2)
+            self._invalidate_open_files(localfs_path1)
+            self._invalidate_open_files(localfs_path2)
 
     def set_xattr(self, filepath, key, value):
         logger.info("set_xattr - %s, %s=%s" % (filepath, key, value))
@@ -328,6 +808,36 @@ class plugin_impl(abstractfs.afsbase):
 
         self.notification_cb = notification_cb
 
+    def set_resync_cb(self, resync_cb):
+        logger.info("set_resync_cb")
+
+        self.resync_cb = resync_cb
+
+    def get_stats(self):
+        stats = {}
+        for k, v in self.fds.get_stats().iteritems():
+            stats["fd_cache_" + k] = v
+        if self.maps is not None:
+            for k, v in self.maps.get_stats().iteritems():
+                stats["mmap_cache_" + k] = v
+
+        if self._role != abstractfs.afsrole.DISCOVER:
+            return stats
+
+        with self.watch_cond:
+            stats.update({
+                "watches": len(self.watches),
+                "max_watches": self.max_watches,
+                "watch_queue": len(self.watch_queue),
+                "unwatched": self.unwatched
+            })
+        with self.resync_cond:
+            stats["overflows"] = self.overflows
+            stats["resyncs"] = self.resyncs
+        for k, v in self.debouncer.get_stats().iteritems():
+            stats["events_" + k] = v
+        return stats
+
     def get_supported_gateways(self):
         return [abstractfs.afsgateway.AG, abstractfs.afsgateway.RG]
 
@@ -336,3 +846,6 @@ class plugin_impl(abstractfs.afsbase):
             abstractfs.afsreplicationmode.BLOCK,
             abstractfs.afsreplicationmode.FILE
         ]
+
+    def is_thread_safe(self):
+        return True
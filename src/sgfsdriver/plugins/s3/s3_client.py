@@ -50,12 +50,16 @@ class s3_status(object):
                  path=None,
                  name=None,
                  size=0,
-                 create_time=0):
+                 checksum=0,
+                 create_time=0,
+                 modify_time=0):
         self.directory = directory
         self.path = path
         self.name = name
         self.size = size
+        self.checksum = checksum
         self.create_time = create_time
+        self.modify_time = modify_time
 
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
@@ -131,7 +135,7 @@ class s3_client(object):
             return self.meta_cache[path]
 
         stats = []
-        paginator = self.session.get_paginator("list_objects")
+        paginator = self.session.get_paginator("list_objects_v2")
         if path == "/":
             dir_path = ""
         else:
@@ -144,9 +148,23 @@ class s3_client(object):
         )
 
         for page in page_iterator:
-            contents = page['Contents']
-            for obj in contents:
+            # sub-directories are rolled up by the delimiter
+            for prefix in page.get('CommonPrefixes', []):
+                key = prefix["Prefix"]
+                sb = s3_status(
+                    directory=True,
+                    path=key.rstrip("/"),
+                    name=key[len(dir_path):].rstrip("/"),
+                    size=0
+                )
+                stats.append(sb)
+
+            for obj in page.get('Contents', []):
                 key = obj["Key"]
+                if key == dir_path:
+                    # the directory object itself
+                    continue
+
                 name = key[len(dir_path):]
                 directory = False
                 size = 0
@@ -160,7 +178,9 @@ class s3_client(object):
                     path=key.rstrip("/"),
                     name=name.rstrip("/"),
                     size=size,
-                    create_time=last_modified
+                    checksum=obj.get("ETag", "").strip('"'),
+                    create_time=last_modified,
+                    modify_time=last_modified
                 )
                 stats.append(sb)
 
@@ -199,6 +219,15 @@ class s3_client(object):
         except Exception:
             return None
 
+    """
+    Returns directory entries in s3_status
+    """
+    def list_dir_stat(self, path):
+        stats = self._ensureDirEntryStatLoaded(path)
+        if stats:
+            return list(stats)
+        return []
+
     """
     Returns directory entries in string
     """
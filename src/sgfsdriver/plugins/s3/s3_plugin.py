@@ -23,6 +23,7 @@ import os
 import logging
 import threading
 import sgfsdriver.lib.abstractfs as abstractfs
+import sgfsdriver.lib.singleflight as singleflight
 import sgfsdriver.plugins.s3.s3_client as s3_client
 
 logger = logging.getLogger('syndicate_s3_filesystem')
@@ -170,6 +171,7 @@ class plugin_impl(abstractfs.afsbase):
         if self.s3:
             self.s3.close()
 
+    @singleflight.coalesced
     @reconnectAtS3Fail
     def stat(self, path):
         logger.info("stat - %s" % path)
@@ -191,6 +193,7 @@ class plugin_impl(abstractfs.afsbase):
             else:
                 return None
 
+    @singleflight.coalesced
     @reconnectAtS3Fail
     def exists(self, path):
         logger.info("exists - %s" % path)
@@ -211,6 +214,27 @@ class plugin_impl(abstractfs.afsbase):
             l = self.s3.list_dir(s3_path)
             return l
 
+    @reconnectAtS3Fail
+    def list_dir_stat(self, dirpath):
+        logger.info("list_dir_stat - %s" % dirpath)
+
+        with self._get_lock():
+            ascii_path = dirpath.encode('ascii', 'ignore')
+            s3_path = self._make_s3_path(ascii_path)
+            driver_dir = self._make_driver_path(s3_path)
+            stats = []
+            for sb in self.s3.list_dir_stat(s3_path):
+                driver_path = driver_dir + "/" + sb.name
+                stats.append(
+                    abstractfs.afsstat(directory=sb.directory,
+                                       path=driver_path,
+                                       name=sb.name,
+                                       size=sb.size,
+                                       checksum=sb.checksum,
+                                       create_time=sb.create_time,
+                                       modify_time=sb.modify_time))
+            return stats
+
     @reconnectAtS3Fail
     def is_dir(self, dirpath):
         logger.info("is_dir - %s" % dirpath)
@@ -221,6 +245,7 @@ class plugin_impl(abstractfs.afsbase):
             d = self.s3.is_dir(s3_path)
             return d
 
+    @singleflight.invalidates
     @reconnectAtS3Fail
     def make_dirs(self, dirpath):
         logger.info("make_dirs - %s" % dirpath)
@@ -241,6 +266,7 @@ class plugin_impl(abstractfs.afsbase):
             buf = self.s3.read(s3_path, offset, size)
             return buf
 
+    @singleflight.invalidates
     @reconnectAtS3Fail
     def write(self, filepath, offset, buf):
         logger.info("write - %s, %d, %d" % (filepath, offset, len(buf)))
@@ -250,6 +276,7 @@ class plugin_impl(abstractfs.afsbase):
             s3_path = self._make_s3_path(ascii_path)
             self.s3.write(s3_path, offset, buf)
 
+    @singleflight.invalidates
     @reconnectAtS3Fail
     def truncate(self, filepath, size):
         logger.info("truncate - %s, %d" % (filepath, size))
@@ -259,6 +286,7 @@ class plugin_impl(abstractfs.afsbase):
             s3_path = self._make_s3_path(ascii_path)
             self.s3.truncate(s3_path, size)
 
+    @singleflight.invalidates
     @reconnectAtS3Fail
     def clear_cache(self, path):
         logger.info("clear_cache - %s" % path)
@@ -271,6 +299,7 @@ class plugin_impl(abstractfs.afsbase):
             else:
                 self.s3.clear_stat_cache(None)
 
+    @singleflight.invalidates
     @reconnectAtS3Fail
     def unlink(self, filepath):
         logger.info("unlink - %s" % filepath)
@@ -280,6 +309,7 @@ class plugin_impl(abstractfs.afsbase):
             s3_path = self._make_s3_path(ascii_path)
             self.s3.unlink(s3_path)
 
+    @singleflight.invalidates
     @reconnectAtS3Fail
     def rename(self, filepath1, filepath2):
         logger.info("rename - %s to %s" % (filepath1, filepath2))
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Concurrency benchmark of file replication on the local plugin
+
+Many threads write and read blocks of many files at once. The same load
+is run with one process-wide lock around every request (as the RG did
+before per-file locking) and with per-file locks only. Each run is
+repeated with a delay added to every plugin call to model the round
+trip to a remote backend. Without the delay the work is bound by the
+interpreter lock, and per-file locking can be slower than one lock
+because of the bookkeeping of the reader/writer locks.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+
+# import packages under src/
+test_dirpath = os.path.dirname(os.path.abspath(__file__))
+driver_root = os.path.dirname(test_dirpath)
+src_root = os.path.join(driver_root, "src")
+sys.path.append(src_root)
+
+import sgfsdriver.lib.abstractfs as abstractfs
+import sgfsdriver.lib.replication as replication
+import sgfsdriver.lib.lockmanager as lockmanager
+
+from sgfsdriver.lib.pluginloader import pluginloader
+
+FILES = 64
+THREADS = 16
+BLOCKS = 32
+BLOCK_SIZE = 64 * 1024
+READS_PER_WRITE = 4
+LATENCIES = [0, 0.002]
+DELAYED_OPS = ["stat", "exists", "read", "write", "truncate", "unlink",
+               "rename"]
+
+
+def delayed(func, latency):
+    def wrap(*args, **kwargs):
+        time.sleep(latency)
+        return func(*args, **kwargs)
+    return wrap
+
+
+def load_fs(storage_dir, latency):
+    plugin_config = {
+        "secrets": {},
+        "work_root": storage_dir
+    }
+    loader = pluginloader()
+    fs = loader.load("local", plugin_config, abstractfs.afsrole.WRITE)
+    fs.connect()
+
+    if latency > 0:
+        for op in DELAYED_OPS:
+            setattr(fs, op, delayed(getattr(fs, op), latency))
+    return fs
+
+
+def run(fs, global_lock):
+    replicas = []
+    for i in xrange(0, FILES):
+        repl = replication.replica(fs, "/file%d" % i, BLOCK_SIZE)
+        repl.fix_consistency()
+        replicas.append(repl)
+
+    buf = "x" * BLOCK_SIZE
+    ops = [0] * THREADS
+
+    def worker(tid):
+        # each thread takes every THREADS-th file
+        for block_id in xrange(0, BLOCKS):
+            for i in xrange(tid, FILES, THREADS):
+                repl = replicas[i]
+                dblock = replication.data_block(block_id, 1, buf)
+                with global_lock:
+                    repl.committer.write_data_blocks([dblock])
+
+                dblock = replication.data_block(block_id, 1, None)
+                for r in xrange(0, READS_PER_WRITE):
+                    with global_lock:
+                        repl.read_data_blocks([dblock])
+                ops[tid] += 1 + READS_PER_WRITE
+
+    threads = []
+    start = time.time()
+    for tid in xrange(0, THREADS):
+        t = threading.Thread(target=worker, args=(tid,))
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+    return sum(ops), elapsed
+
+
+def report(name, nops, elapsed):
+    print "%-12s %8d ops %8.2f sec %10.1f ops/sec" % \
+        (name, nops, elapsed, nops / elapsed)
+
+
+def main():
+    print "Concurrency benchmark: %d files, %d threads, %d blocks of %d" % \
+        (FILES, THREADS, BLOCKS, BLOCK_SIZE)
+
+    for latency in LATENCIES:
+        print "latency per plugin call: %.1f ms" % (latency * 1000)
+        for name, global_lock in [("serialized", threading.RLock()),
+                                  ("per-file", lockmanager.null_lock())]:
+            storage_dir = tempfile.mkdtemp(prefix="sgfs_bench_")
+            try:
+                fs = load_fs(storage_dir, latency)
+                nops, elapsed = run(fs, global_lock)
+                report(name, nops, elapsed)
+                fs.close()
+            finally:
+                shutil.rmtree(storage_dir)
+
+if __name__ == "__main__":
+    main()
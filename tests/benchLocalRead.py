@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Random read benchmark of the local plugin
+
+Threads read blocks at random offsets of a few files through the local
+plugin. The plugin with its descriptor cache disabled, which opens and
+closes the file on every read as it did before, is compared with the
+plugin keeping files open. Files are read once before the runs, so the
+page cache is warm. Logging of the plugin is turned down to measure the
+reads only.
+"""
+
+import os
+import sys
+import time
+import random
+import logging
+import shutil
+import tempfile
+import threading
+
+# import packages under src/
+test_dirpath = os.path.dirname(os.path.abspath(__file__))
+driver_root = os.path.dirname(test_dirpath)
+src_root = os.path.join(driver_root, "src")
+sys.path.append(src_root)
+
+import sgfsdriver.lib.abstractfs as abstractfs
+
+from sgfsdriver.lib.pluginloader import pluginloader
+
+FILES = 8
+FILE_SIZE = 16 * 1024 * 1024
+THREADS = [1, 4]
+# (block size, reads per run)
+READS = [(4 * 1024, 40000), (1024 * 1024, 1000)]
+
+
+def load_fs(storage_dir, fd_cache_size):
+    plugin_config = {
+        "secrets": {},
+        "work_root": storage_dir,
+        "fd_cache_size": fd_cache_size
+    }
+    loader = pluginloader()
+    fs = loader.load("local", plugin_config, abstractfs.afsrole.READ)
+    fs.connect()
+
+    logging.getLogger("syndicate_local_filesystem").setLevel(
+        logging.WARNING)
+    return fs
+
+
+def make_files(storage_dir):
+    chunk = os.urandom(1024 * 1024)
+    for i in xrange(0, FILES):
+        with open(os.path.join(storage_dir, "file%d" % i), "wb") as f:
+            for c in xrange(0, FILE_SIZE / len(chunk)):
+                f.write(chunk)
+
+        # warm the page cache
+        with open(os.path.join(storage_dir, "file%d" % i), "rb") as f:
+            while f.read(len(chunk)):
+                pass
+
+
+def run(read, block_size, nreads, nthreads):
+    def worker(tid):
+        rand = random.Random(tid)
+        blocks = FILE_SIZE / block_size
+        for r in xrange(0, nreads / nthreads):
+            path = "/file%d" % rand.randint(0, FILES - 1)
+            offset = rand.randint(0, blocks - 1) * block_size
+            buf = read(path, offset, block_size)
+            assert len(buf) == block_size
+
+    threads = []
+    start = time.time()
+    for tid in xrange(0, nthreads):
+        t = threading.Thread(target=worker, args=(tid,))
+        t.start()
+        threads.append(t)
+
+    for t in threads:
+        t.join()
+    return time.time() - start
+
+
+def report(name, block_size, nreads, nthreads, elapsed):
+    print "%-8s %8d bytes %2d threads %8.2f sec %10.1f reads/sec " \
+        "%8.1f MB/sec" % \
+        (name, block_size, nthreads, elapsed, nreads / elapsed,
+         nreads * block_size / elapsed / (1024 * 1024))
+
+
+def main():
+    print "Local read benchmark: %d files of %d bytes" % \
+        (FILES, FILE_SIZE)
+
+    storage_dir = tempfile.mkdtemp(prefix="sgfs_bench_")
+    try:
+        make_files(storage_dir)
+        filesystems = [("reopen", load_fs(storage_dir, 0)),
+                       ("cached", load_fs(storage_dir, FILES))]
+        for block_size, nreads in READS:
+            for nthreads in THREADS:
+                for name, fs in filesystems:
+                    elapsed = run(fs.read, block_size, nreads, nthreads)
+                    report(name, block_size, nreads, nthreads, elapsed)
+
+        for name, fs in filesystems:
+            fs.close()
+    finally:
+        shutil.rmtree(storage_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+File replication write benchmark of the local plugin
+
+Files are replicated block by block through the local plugin, as the RG
+driver does in file replication mode, with blocks of the files arriving
+interleaved, in order and shuffled. Runs with preallocation from the
+expected file size are compared with runs growing files as blocks are
+written. The time includes flushing the files to disk, since that is
+when space is allocated. Fragmentation is the number of extents of the
+files, read with the FIEMAP ioctl; it is shown as "n/a" when the file
+system does not support it.
+"""
+
+import os
+import sys
+import time
+import fcntl
+import struct
+import random
+import logging
+import shutil
+import tempfile
+
+# import packages under src/
+test_dirpath = os.path.dirname(os.path.abspath(__file__))
+driver_root = os.path.dirname(test_dirpath)
+src_root = os.path.join(driver_root, "src")
+sys.path.append(src_root)
+
+import sgfsdriver.lib.abstractfs as abstractfs
+import sgfsdriver.lib.replication as replication
+
+from sgfsdriver.lib.pluginloader import pluginloader
+
+FILES = 4
+BLOCK_SIZE = 64 * 1024
+BLOCKS = 512
+# blocks committed in a transaction
+BATCH = 8
+
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_FLAG_SYNC = 0x1
+# start, length, flags, mapped extents, extent count, reserved
+FIEMAP_HEADER = struct.Struct("=QQIIII")
+
+
+def load_fs(storage_dir, preallocate):
+    plugin_config = {
+        "secrets": {},
+        "work_root": storage_dir,
+        "preallocate": preallocate
+    }
+    loader = pluginloader()
+    fs = loader.load("local", plugin_config, abstractfs.afsrole.READ)
+    fs.connect()
+
+    logging.getLogger("syndicate_local_filesystem").setLevel(
+        logging.WARNING)
+    return fs
+
+
+def count_extents(path):
+    buf = FIEMAP_HEADER.pack(0, 0xffffffffffffffff, FIEMAP_FLAG_SYNC,
+                             0, 0, 0)
+    with open(path, "rb") as f:
+        try:
+            buf = fcntl.ioctl(f.fileno(), FS_IOC_FIEMAP, buf)
+        except IOError:
+            return None
+    return FIEMAP_HEADER.unpack(buf)[3]
+
+
+def run(fs, storage_dir, shuffle):
+    data = os.urandom(BLOCK_SIZE)
+    start = time.time()
+    replicas = []
+    for i in xrange(0, FILES):
+        block_ids = range(0, BLOCKS)
+        if shuffle:
+            random.Random(i).shuffle(block_ids)
+
+        repl = replication.replica(fs, "/file%d" % i, BLOCK_SIZE)
+        repl.fix_consistency()
+        replicas.append((repl, block_ids))
+
+    # files are written at the same time, as by concurrent writers
+    for b in xrange(0, BLOCKS, BATCH):
+        for repl, block_ids in replicas:
+            # the RG driver gives the size in the manifest
+            repl.set_size_hint(BLOCKS * BLOCK_SIZE)
+            repl.begin_transaction()
+            repl.write_data_blocks(
+                [replication.data_block(block_id, 1, data)
+                 for block_id in block_ids[b:b + BATCH]])
+            repl.commit()
+
+    local_paths = [os.path.join(storage_dir, "file%d" % i)
+                   for i in xrange(0, FILES)]
+    for local_path in local_paths:
+        with open(local_path, "rb") as f:
+            os.fsync(f.fileno())
+    elapsed = time.time() - start
+
+    extents = 0
+    for local_path in local_paths:
+        file_extents = count_extents(local_path)
+        if file_extents is None or extents is None:
+            extents = None
+        else:
+            extents += file_extents
+    return elapsed, extents
+
+
+def report(name, order, elapsed, extents):
+    nbytes = FILES * BLOCKS * BLOCK_SIZE
+    if extents is None:
+        extents_str = "n/a"
+    else:
+        extents_str = "%.1f" % (float(extents) / FILES)
+
+    print "%-10s %-10s %8.2f sec %8.1f MB/sec %8s extents/file" % \
+        (name, order, elapsed, nbytes / elapsed / (1024 * 1024),
+         extents_str)
+
+
+def main():
+    print "Local write benchmark: %d files of %d blocks of %d bytes" % \
+        (FILES, BLOCKS, BLOCK_SIZE)
+
+    for order, shuffle in [("in-order", False), ("shuffled", True)]:
+        for name, preallocate in [("growing", False),
+                                  ("prealloc", True)]:
+            storage_dir = tempfile.mkdtemp(prefix="sgfs_bench_")
+            try:
+                fs = load_fs(storage_dir, preallocate)
+                elapsed, extents = run(fs, storage_dir, shuffle)
+                report(name, order, elapsed, extents)
+                fs.close()
+            finally:
+                shutil.rmtree(storage_dir)
+
+if __name__ == "__main__":
+    main()
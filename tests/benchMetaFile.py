@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Micro-benchmark of replication meta file bookkeeping
+
+Compares the cost of a single block update (write the block meta, compact,
+get the data file size) on a file with many blocks between the previous
+list-scanning implementation and replication.meta_file.
+"""
+
+import os
+import sys
+import time
+import random
+
+# import packages under src/
+test_dirpath = os.path.dirname(os.path.abspath(__file__))
+driver_root = os.path.dirname(test_dirpath)
+src_root = os.path.join(driver_root, "src")
+sys.path.append(src_root)
+
+import sgfsdriver.lib.abstractfs as abstractfs
+import sgfsdriver.lib.replication as replication
+
+BLOCKS = 1000000
+BLOCK_SIZE = 1024
+
+
+class null_fs(abstractfs.afsbase):
+    """
+    filesystem that stores nothing, so only bookkeeping is measured
+    """
+    def connect(self):
+        pass
+
+    def close(self):
+        pass
+
+    def stat(self, path):
+        return None
+
+    def exists(self, path):
+        return False
+
+    def list_dir(self, dirpath):
+        return []
+
+    def is_dir(self, dirpath):
+        return False
+
+    def make_dirs(self, dirpath):
+        pass
+
+    def read(self, filepath, offset, size):
+        return ""
+
+    def write(self, filepath, offset, buf):
+        pass
+
+    def truncate(self, filepath, size):
+        pass
+
+    def unlink(self, filepath):
+        pass
+
+    def rename(self, filepath1, filepath2):
+        pass
+
+    def clear_cache(self, path):
+        pass
+
+    def plugin(self):
+        return self.__class__
+
+    def role(self):
+        return abstractfs.afsrole.WRITE
+
+    def set_notification_cb(self, notification_cb):
+        pass
+
+    def get_supported_gateways(self):
+        return [abstractfs.afsgateway.RG]
+
+    def get_supported_replication_mode(self):
+        return [abstractfs.afsreplicationmode.FILE]
+
+
+class list_meta(object):
+    """
+    block meta bookkeeping as done before (list scan and slice)
+    """
+    def __init__(self):
+        self.blocks = []
+
+    def write_block_meta(self, block_id, meta):
+        if len(self.blocks) > block_id:
+            self.blocks[block_id] = meta
+        else:
+            for i in range(0, block_id - len(self.blocks) + 1):
+                self.blocks.append(replication.block_meta(False, 0, 0))
+            self.blocks[block_id] = meta
+        self.compact_block_meta()
+
+    def compact_block_meta(self):
+        cut_blocks_to = 0
+        for i in xrange(len(self.blocks), 0, -1):
+            if not self.blocks[i - 1].is_empty():
+                cut_blocks_to = i
+                break
+        self.blocks = self.blocks[:cut_blocks_to]
+
+    def get_data_file_size(self):
+        data_file_size = 0
+        for i in xrange(0, len(self.blocks)):
+            data_file_size += self.blocks[i].size
+        return data_file_size
+
+
+def make_meta(block_id):
+    return replication.block_meta(
+        replication.block_meta.META_FLAG_DATAIN, 1, BLOCK_SIZE
+    )
+
+
+def report(name, elapsed, updates):
+    print "%-10s %12.2f us/op (%d ops)" % \
+        (name, elapsed * 1000000 / updates, updates)
+
+
+def bench_meta_file(updates):
+    meta = replication.meta_file(null_fs(), "/bench")
+    for block_id in xrange(0, BLOCKS):
+        meta.write_block_meta(block_id, make_meta(block_id), False)
+
+    # random single-block updates as done by RG block writes
+    start = time.time()
+    for i in xrange(0, updates):
+        block_id = random.randint(0, BLOCKS - 1)
+        meta.write_block_meta(block_id, make_meta(block_id), False)
+        meta.get_data_file_size()
+    report("meta_file", time.time() - start, updates)
+
+
+def bench_list_scan(updates):
+    # filling is quadratic with the old implementation,
+    # so the list is built directly
+    meta = list_meta()
+    meta.blocks = [make_meta(block_id) for block_id in xrange(0, BLOCKS)]
+
+    start = time.time()
+    for i in xrange(0, updates):
+        block_id = random.randint(0, BLOCKS - 1)
+        meta.write_block_meta(block_id, make_meta(block_id))
+        meta.get_data_file_size()
+    report("list scan", time.time() - start, updates)
+
+
+def main():
+    print "Meta file micro-benchmark with %d blocks" % BLOCKS
+    bench_meta_file(100000)
+    bench_list_scan(20)
+
+if __name__ == "__main__":
+    main()
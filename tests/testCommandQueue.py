@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Command queue module test
+"""
+
+import os
+import sys
+import threading
+
+# import packages under src/
+test_dirpath = os.path.dirname(os.path.abspath(__file__))
+driver_root = os.path.dirname(test_dirpath)
+src_root = os.path.join(driver_root, "src")
+sys.path.append(src_root)
+
+from sgfsdriver.lib.commandqueue import command_queue
+
+
+def put_cmd(path):
+    return {"op": "put", "path": path}
+
+
+def delete_cmd(path):
+    return {"op": "delete", "path": path}
+
+
+def drain(queue):
+    cmds = []
+    for cmd, sems in queue.get_batch(len(queue), False):
+        cmds.append((cmd["op"], cmd["path"]))
+    return cmds
+
+
+def test_merge_order():
+    queue = command_queue()
+    queue.put(put_cmd("/a"))
+    queue.put(put_cmd("/b"))
+    queue.put(put_cmd("/a"))
+    # the merged command moves to the tail
+    assert drain(queue) == [("put", "/b"), ("put", "/a")]
+    assert queue.get_stats()["merged"] == 1
+
+    queue.put(put_cmd("/a"), priority=True)
+    queue.put(put_cmd("/b"))
+    queue.put(put_cmd("/c"), priority=True)
+    queue.put(put_cmd("/a"))
+    # a merged priority command stays ahead of the others
+    assert drain(queue) == [("put", "/c"), ("put", "/a"), ("put", "/b")]
+
+
+def test_delete_after_put():
+    queue = command_queue()
+    queue.put(put_cmd("/d"))
+    queue.put(put_cmd("/d/f"))
+    queue.put(delete_cmd("/d/f"))
+    queue.put(delete_cmd("/d"))
+    # children are deleted before their directory
+    assert drain(queue) == [("delete", "/d/f"), ("delete", "/d")]
+
+    queue.put(delete_cmd("/d/f"))
+    queue.put(delete_cmd("/d"))
+    queue.put(put_cmd("/d"))
+    queue.put(put_cmd("/d/f"))
+    # a recreated directory comes before its children
+    assert drain(queue) == [("put", "/d"), ("put", "/d/f")]
+
+
+def test_semaphore_release():
+    queue = command_queue()
+    sem1 = threading.Semaphore(0)
+    sem2 = threading.Semaphore(0)
+    queue.put(put_cmd("/a"), sem1)
+    queue.put(put_cmd("/b"))
+    queue.put(delete_cmd("/a"), sem2)
+
+    batch = queue.get_batch(2)
+    assert [cmd["path"] for cmd, sems in batch] == ["/b", "/a"]
+    # waiters of merged commands come with the surviving one
+    assert batch[0][1] == []
+    assert batch[1][0]["op"] == "delete"
+    assert batch[1][1] == [sem1, sem2]
+
+    for cmd, sems in batch:
+        for sem in sems:
+            sem.release()
+    queue.task_done(len(batch))
+    assert sem1.acquire(False)
+    assert sem2.acquire(False)
+    assert queue.empty()
+    assert queue.get_stats()["processed"] == 2
+
+
+def main():
+    tests = [test_merge_order, test_delete_after_put,
+             test_semaphore_release]
+    for test in tests:
+        print "%s" % test.__name__
+        test()
+    print "ok"
+
+if __name__ == "__main__":
+    main()
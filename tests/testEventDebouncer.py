@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Event debouncer module test
+"""
+
+import os
+import sys
+import time
+
+# import packages under src/
+test_dirpath = os.path.dirname(os.path.abspath(__file__))
+driver_root = os.path.dirname(test_dirpath)
+src_root = os.path.join(driver_root, "src")
+sys.path.append(src_root)
+
+from sgfsdriver.lib.eventdebouncer import event_debouncer
+
+
+def delivered_events(batches):
+    events = []
+    for batch in batches:
+        events.extend(batch)
+    return events
+
+
+def test_merge():
+    batches = []
+    debouncer = event_debouncer(batches.append, window=10.0)
+    debouncer.add("create", "/a")
+    debouncer.add("modify", "/a")
+    debouncer.add("modify", "/b")
+    debouncer.add("modify", "/b")
+    debouncer.add("remove", "/c")
+    debouncer.add("modify", "/c")
+    debouncer.add("modify", "/d")
+    debouncer.add("remove", "/d")
+
+    # stop delivers what is pending
+    debouncer.stop()
+    assert batches == [[("create", "/a"), ("modify", "/b"),
+                        ("remove", "/c"), ("remove", "/d")]]
+
+    stats = debouncer.get_stats()
+    assert stats["received"] == 8
+    assert stats["delivered"] == 4
+    assert stats["pending"] == 0
+
+
+def test_window():
+    batches = []
+    debouncer = event_debouncer(batches.append, window=0.1)
+    debouncer.start()
+    try:
+        debouncer.add("modify", "/a")
+        time.sleep(0.5)
+        assert batches == [[("modify", "/a")]]
+    finally:
+        debouncer.stop()
+
+
+def test_max_delay():
+    batches = []
+    debouncer = event_debouncer(batches.append, window=0.2,
+                                max_delay=0.5)
+    debouncer.start()
+    try:
+        # events keep coming within the window
+        start = time.time()
+        while not batches and time.time() - start < 2.0:
+            debouncer.add("modify", "/a")
+            time.sleep(0.05)
+
+        assert batches, "events were held past max_delay"
+        assert time.time() - start < 1.0
+        assert delivered_events(batches) == [("modify", "/a")]
+    finally:
+        debouncer.stop()
+
+
+def test_urgent():
+    batches = []
+    debouncer = event_debouncer(batches.append, window=10.0)
+    debouncer.start()
+    try:
+        debouncer.add("modify", "/a")
+        debouncer.add("remove", "/b", urgent=True)
+        time.sleep(0.2)
+        # other events due are not delivered with it
+        assert batches == [[("remove", "/b")]]
+    finally:
+        debouncer.stop()
+    assert batches[-1] == [("modify", "/a")]
+
+
+def test_zero_window():
+    batches = []
+    debouncer = event_debouncer(batches.append, window=0)
+    debouncer.start()
+    try:
+        debouncer.add("modify", "/a")
+        time.sleep(0.2)
+        assert batches == [[("modify", "/a")]]
+    finally:
+        debouncer.stop()
+
+
+def test_failed_delivery():
+    batches = []
+    errors = []
+
+    def deliver(batch):
+        batches.append(batch)
+        if len(batches) == 1:
+            raise IOError("failed")
+
+    def on_error(batch):
+        # called while the exception is handled
+        errors.append((batch, sys.exc_info()[0]))
+
+    debouncer = event_debouncer(deliver, window=0, on_error=on_error)
+    debouncer.start()
+    try:
+        debouncer.add("modify", "/a")
+        time.sleep(0.2)
+        # later events are still delivered
+        debouncer.add("modify", "/b")
+        time.sleep(0.2)
+    finally:
+        debouncer.stop()
+
+    assert batches == [[("modify", "/a")], [("modify", "/b")]]
+    assert errors == [([("modify", "/a")], IOError)]
+    stats = debouncer.get_stats()
+    assert stats["delivered"] == 2
+    assert stats["failed"] == 1
+
+
+def main():
+    tests = [test_merge, test_window, test_max_delay, test_urgent,
+             test_zero_window, test_failed_delivery]
+    for test in tests:
+        print "%s" % test.__name__
+        test()
+    print "ok"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Lock manager module test
+"""
+
+import os
+import sys
+import gc
+import time
+import threading
+
+# import packages under src/
+test_dirpath = os.path.dirname(os.path.abspath(__file__))
+driver_root = os.path.dirname(test_dirpath)
+src_root = os.path.join(driver_root, "src")
+sys.path.append(src_root)
+
+from sgfsdriver.lib.lockmanager import rwlock, lock_manager
+
+# time given to a thread to block on a lock
+WAIT = 0.1
+
+
+def start_thread(target):
+    t = threading.Thread(target=target)
+    t.daemon = True
+    t.start()
+    return t
+
+
+def test_reentrancy():
+    l = rwlock()
+    with l:
+        with l:
+            # the exclusive owner can also take it shared
+            with l.shared():
+                pass
+        assert l.owner is not None
+    assert l.owner is None
+
+    with l.shared():
+        with l.shared():
+            pass
+        assert len(l.readers) == 1
+    assert not l.readers
+
+
+def test_upgrade():
+    l = rwlock()
+    with l.shared():
+        try:
+            l.acquire()
+            assert False, "a shared lock was upgraded"
+        except RuntimeError:
+            pass
+    assert not l.readers
+
+    try:
+        l.release()
+        assert False, "an un-acquired lock was released"
+    except RuntimeError:
+        pass
+
+
+def test_exclusion():
+    l = rwlock()
+    events = []
+
+    def reader():
+        with l.shared():
+            events.append("reader")
+
+    with l:
+        t = start_thread(reader)
+        time.sleep(WAIT)
+        # readers wait for the writer
+        assert events == []
+        events.append("writer")
+    t.join()
+    assert events == ["writer", "reader"]
+
+
+def test_writer_preference():
+    l = rwlock()
+    events = []
+
+    def writer():
+        with l:
+            events.append("writer")
+
+    def reader():
+        with l.shared():
+            events.append("reader")
+
+    l.acquire_shared()
+    w = start_thread(writer)
+    time.sleep(WAIT)
+    # a waiting writer blocks new readers
+    r = start_thread(reader)
+    time.sleep(WAIT)
+    assert events == []
+    l.release_shared()
+
+    w.join()
+    r.join()
+    assert events == ["writer", "reader"]
+
+
+def test_lock_manager():
+    locks = lock_manager()
+    l1 = locks.get_lock("/a")
+    assert locks.get_lock("/a") is l1
+    assert locks.get_lock("/b") is not l1
+    # the lock of /b is not held by anyone
+    gc.collect()
+    assert len(locks) == 1
+
+    # the lock moves with the file on rename
+    locks.rename("/a", "/c")
+    assert locks.get_lock("/c") is l1
+    assert locks.get_lock("/a") is not l1
+
+    del l1
+    gc.collect()
+    assert len(locks) == 0
+
+
+def main():
+    tests = [test_reentrancy, test_upgrade, test_exclusion,
+             test_writer_preference, test_lock_manager]
+    for test in tests:
+        print "%s" % test.__name__
+        test()
+    print "ok"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+LRU cache module test
+"""
+
+import os
+import sys
+import time
+
+# import packages under src/
+test_dirpath = os.path.dirname(os.path.abspath(__file__))
+driver_root = os.path.dirname(test_dirpath)
+src_root = os.path.join(driver_root, "src")
+sys.path.append(src_root)
+
+from sgfsdriver.lib.lrucache import lru_cache
+
+
+def make_cache(**kwargs):
+    evicted = []
+    cache = lru_cache(on_evict=lambda key, value: evicted.append(key),
+                      **kwargs)
+    return cache, evicted
+
+
+def test_eviction_order():
+    cache, evicted = make_cache(max_len=3)
+    for key in ["a", "b", "c"]:
+        cache[key] = key
+    cache["d"] = "d"
+    # the least recently put goes first
+    assert evicted == ["a"]
+
+    # a hit makes an entry the most recently used
+    assert cache.get("b") == "b"
+    cache["e"] = "e"
+    assert evicted == ["a", "c"]
+
+    # so does putting it again
+    cache["b"] = "b"
+    cache["f"] = "f"
+    assert evicted == ["a", "c", "d"]
+    assert sorted(cache.keys()) == ["b", "e", "f"]
+
+    # a miss changes nothing
+    assert cache.get("a") is None
+    cache["g"] = "g"
+    assert evicted == ["a", "c", "d", "e"]
+    assert cache.get_stats()["evictions"] == 4
+
+
+def test_max_bytes():
+    cache, evicted = make_cache(max_bytes=10, sizeof=len)
+    cache["a"] = "x" * 4
+    cache["b"] = "x" * 4
+    cache["c"] = "x" * 4
+    assert evicted == ["a"]
+    assert cache.get_stats()["bytes"] == 8
+
+    # one large entry pushes out all others but itself
+    cache["d"] = "x" * 20
+    assert evicted == ["a", "b", "c"]
+    assert cache.keys() == ["d"]
+
+    # removed entries give their bytes back
+    cache.pop("d")
+    assert cache.get_stats()["bytes"] == 0
+
+
+def test_growing_value():
+    cache, evicted = make_cache(max_bytes=10, sizeof=len)
+    a = []
+    cache["a"] = a
+    cache["b"] = [0] * 5
+    a.extend([0] * 8)
+    # the size is updated on access, evicting the others
+    assert cache.get("a") is a
+    assert evicted == ["b"]
+    assert cache.get_stats()["bytes"] == 8
+
+
+def test_ttl():
+    cache, evicted = make_cache(ttl=0.1)
+    cache["a"] = "a"
+    assert "a" in cache
+    time.sleep(0.2)
+    assert "a" not in cache
+    assert cache.get("a") is None
+    assert evicted == ["a"]
+
+
+def main():
+    tests = [test_eviction_order, test_max_bytes, test_growing_value,
+             test_ttl]
+    for test in tests:
+        print "%s" % test.__name__
+        test()
+    print "ok"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Single flight module test
+"""
+
+import os
+import sys
+import threading
+import time
+
+# import packages under src/
+test_dirpath = os.path.dirname(os.path.abspath(__file__))
+driver_root = os.path.dirname(test_dirpath)
+src_root = os.path.join(driver_root, "src")
+sys.path.append(src_root)
+
+import sgfsdriver.lib.singleflight as singleflight
+
+
+class blocking_fs(object):
+    """
+    stat blocks until released, so calls overlap
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.size = 0
+        self.calls = 0
+
+    def _get_lock(self):
+        return self.lock
+
+    @singleflight.coalesced
+    def stat(self, path):
+        # the size when the call starts
+        size = self.size
+        self.calls += 1
+        self.started.set()
+        self.release.wait()
+        return size
+
+    @singleflight.invalidates
+    def write(self, path, size):
+        self.size = size
+
+
+def run(func, *args):
+    results = []
+    t = threading.Thread(target=lambda: results.append(func(*args)))
+    t.daemon = True
+    t.start()
+    return t, results
+
+
+def make_blocking_call(result):
+    release = threading.Event()
+    started = threading.Event()
+
+    def call():
+        started.set()
+        release.wait()
+        return result
+    return call, started, release
+
+
+def test_coalesce():
+    flights = singleflight.single_flight()
+    call, started, release = make_blocking_call("old")
+    first, first_results = run(flights.do, "k", call)
+    started.wait()
+    second, second_results = run(flights.do, "k", call)
+
+    # the second call waits for the first
+    while flights.get_stats()["shared"] == 0:
+        time.sleep(0.01)
+    release.set()
+    first.join()
+    second.join()
+    assert first_results == ["old"]
+    assert second_results == ["old"]
+    assert flights.get_stats() == {"inflight": 0, "calls": 1, "shared": 1}
+
+
+def test_do_after():
+    flights = singleflight.single_flight()
+    call, started, release = make_blocking_call("old")
+    t, results = run(flights.do_after, "k", 1, call)
+    started.wait()
+
+    # a newer generation does not join the running call
+    assert flights.do_after("k", 2, lambda: "new") == "new"
+    release.set()
+    t.join()
+    assert results == ["old"]
+    assert flights.get_stats() == {"inflight": 0, "calls": 2, "shared": 0}
+
+
+def test_after_write():
+    fs = blocking_fs()
+    t, results = run(fs.stat, "/a")
+    fs.started.wait()
+    fs.write("/a", 10)
+
+    # a stat after the write does not join the one started before
+    fs.release.set()
+    assert fs.stat("/a") == 10
+    t.join()
+    assert results == [0]
+    assert fs.calls == 2
+
+
+def main():
+    tests = [test_coalesce, test_do_after, test_after_write]
+    for test in tests:
+        print "%s" % test.__name__
+        test()
+    print "ok"
+
+if __name__ == "__main__":
+    main()
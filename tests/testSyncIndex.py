@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+"""
+Sync index module test
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+
+# import packages under src/
+test_dirpath = os.path.dirname(os.path.abspath(__file__))
+driver_root = os.path.dirname(test_dirpath)
+src_root = os.path.join(driver_root, "src")
+sys.path.append(src_root)
+
+from sgfsdriver.lib.abstractfs import afsstat
+from sgfsdriver.lib.commandqueue import command_queue
+from sgfsdriver.lib.syncindex import sync_index, publish_sem
+
+# time given to a thread to block
+WAIT = 0.1
+
+
+def make_stat(size=0, directory=False):
+    return afsstat(directory=directory, size=size, modify_time=1)
+
+
+def crawl(index, entries):
+    """
+    observe entries as the AG crawl does and return the changed paths
+    """
+    changes = {}
+    for path, st in entries:
+        change = index.observe(path, st)
+        if change:
+            changes[path] = change
+    return changes
+
+
+def test_incremental(index_path):
+    index = sync_index(index_path)
+    assert not index.load()
+    changes = crawl(index, [("/d", make_stat(directory=True)),
+                            ("/d/a", make_stat(1)),
+                            ("/d/b", make_stat(2))])
+    assert changes == {"/d": "added", "/d/a": "added", "/d/b": "added"}
+    assert index.get_removed() == []
+    index.save()
+
+    index = sync_index(index_path)
+    assert index.load()
+    changes = crawl(index, [("/d", make_stat(directory=True)),
+                            ("/d/a", make_stat(10))])
+    assert changes == {"/d/a": "updated"}
+    assert index.get_removed() == ["/d/b"]
+    index.save()
+
+    # a directory that fails to list keeps its entries
+    index = sync_index(index_path)
+    assert index.load()
+    assert crawl(index, [("/d", make_stat(directory=True))]) == {}
+    index.fail_dir("/d")
+    assert index.get_removed() == []
+    index.save()
+    assert index.load()
+    assert len(index) == 2
+
+
+def test_restart_before_drain(index_path):
+    queue = command_queue()
+    published = publish_sem()
+
+    index = sync_index(index_path)
+    index.load()
+    changes = crawl(index, [("/a", make_stat(1)), ("/b", make_stat(2))])
+    for path in sorted(changes):
+        queue.put({"path": path}, published)
+
+    t = threading.Thread(target=index.save_after,
+                         args=(published, len(changes)))
+    t.daemon = True
+    t.start()
+    time.sleep(WAIT)
+
+    # a restart now must publish the entries again
+    restarted = sync_index(index_path)
+    assert not restarted.load()
+    assert crawl(restarted, [("/a", make_stat(1))]) == {"/a": "added"}
+
+    # the snapshot is saved once the queue is drained
+    for cmd, sems in queue.get_batch(len(changes)):
+        for sem in sems:
+            sem.release()
+    t.join()
+
+    restarted = sync_index(index_path)
+    assert restarted.load()
+    assert crawl(restarted, [("/a", make_stat(1)),
+                             ("/b", make_stat(2))]) == {}
+
+
+def test_failed_publish(index_path):
+    index = sync_index(index_path)
+    index.load()
+    crawl(index, [("/a", make_stat(1)), ("/b", make_stat(2))])
+    index.save()
+
+    # /a is updated, /b removed and /c added, but none is published
+    index = sync_index(index_path)
+    assert index.load()
+    changes = crawl(index, [("/a", make_stat(10)), ("/c", make_stat(3)),
+                            ("/d", make_stat(4))])
+    assert changes == {"/a": "updated", "/c": "added", "/d": "added"}
+    assert index.get_removed() == ["/b"]
+
+    published = publish_sem()
+    for path in ["/a", "/b", "/c"]:
+        published.fail(path)
+    published.release()
+    index.save_after(published, 4)
+
+    # the failed changes are found again after a restart
+    index = sync_index(index_path)
+    assert index.load()
+    changes = crawl(index, [("/a", make_stat(10)), ("/c", make_stat(3)),
+                            ("/d", make_stat(4))])
+    assert changes == {"/a": "updated", "/c": "added"}
+    assert index.get_removed() == ["/b"]
+
+
+def main():
+    tests = [test_incremental, test_restart_before_drain,
+             test_failed_publish]
+    work_dir = tempfile.mkdtemp(prefix="sgfs_test_")
+    try:
+        for test in tests:
+            print "%s" % test.__name__
+            test(os.path.join(work_dir, "%s.index" % test.__name__))
+    finally:
+        shutil.rmtree(work_dir)
+    print "ok"
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,10 @@
    limitations under the License.
 """
 
+from sgfsdriver.lib import replication
+
 REP_TARGET_FILE = "/REPLICA_TARGET_FILE"
+PREALLOC_FILE = "/REPLICA_PREALLOC_FILE"
 
 
 class replication_test_impl():
@@ -26,6 +29,55 @@ class replication_test_impl():
 
         self.driver = driver
 
+    def _remove(self, path):
+        fs = self.driver.fs
+        for p in [path, replication.replica.make_incomplete_path(path),
+                  replication.meta_file.make_meta_path(path),
+                  replication.undo_log.make_log_path(path)]:
+            if fs.exists(p):
+                fs.unlink(p)
+
+    def test_preallocate(self):
+        fs = self.driver.fs
+        block_size = self.driver.block_size
+        self._remove(PREALLOC_FILE)
+
+        calls = []
+        fs_preallocate = fs.preallocate
+
+        def counting_preallocate(filepath, offset, size):
+            calls.append((filepath, offset, size))
+            return fs_preallocate(filepath, offset, size)
+
+        fs.preallocate = counting_preallocate
+        try:
+            repl = replication.replica(fs, PREALLOC_FILE, block_size)
+            repl.fix_consistency()
+
+            # sequential writes, one transaction each
+            for block_id in xrange(0, 10):
+                repl.set_size_hint(10 * block_size)
+                dblock = replication.data_block(block_id, 1, "p" * block_size)
+                repl.committer.write_data_blocks([dblock])
+
+            # the space is allocated once for the hinted size
+            part_path = replication.replica.make_incomplete_path(
+                PREALLOC_FILE)
+            assert calls == [(part_path, 0, 10 * block_size)]
+
+            # a shrinking truncate frees the space
+            repl.committer.delete_data_blocks(
+                [replication.data_block(9, 1, None)])
+            del calls[:]
+            repl.set_size_hint(10 * block_size)
+            dblock = replication.data_block(9, 2, "q" * block_size)
+            repl.committer.write_data_blocks([dblock])
+            assert calls == [(part_path, 0, 10 * block_size)]
+        finally:
+            del fs.preallocate
+
+        self._remove(PREALLOC_FILE)
+
     def start(self):
         """
         replicate test
@@ -74,3 +126,9 @@ class replication_test_impl():
         """
         print "Delete test ../REPLICA_TARGET_FILE"
         self.driver.delete_all("/REPLICA_TARGET_FILE", 2)
+
+        """
+        preallocation test
+        """
+        print "Preallocate test ../REPLICA_PREALLOC_FILE"
+        self.test_preallocate()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import pickle
+
+from sgfsdriver.lib.replication import meta_file
+from sgfsdriver.lib.replication import block_meta
+
+LEGACY_FILE = "/META_FILE_LEGACY_FILE"
+V1_FILE = "/META_FILE_V1_FILE"
+TORN_FILE = "/META_FILE_TORN_FILE"
+
+DATAIN = block_meta.META_FLAG_DATAIN
+EMPTY = block_meta.META_FLAG_EMPTY
+
+
+class replication_test_impl():
+    def __init__(self, driver):
+        if not driver:
+            raise ValueError("driver is not given correctly")
+
+        self.driver = driver
+        self.fs = driver.fs
+
+    def _read_meta_file(self, path):
+        meta_path = meta_file.make_meta_path(path)
+        st = self.fs.stat(meta_path)
+        return self.fs.read(meta_path, 0, st.size)
+
+    def _remove(self, path):
+        meta_path = meta_file.make_meta_path(path)
+        if self.fs.exists(meta_path):
+            self.fs.unlink(meta_path)
+
+    def _blocks(self, meta):
+        blocks = []
+        for i in xrange(0, meta.get_block_meta_len()):
+            bmeta = meta.read_block_meta(i)
+            blocks.append((bmeta.flag, bmeta.version, bmeta.size))
+        return blocks
+
+    def _check_current_format(self, path):
+        buf = self._read_meta_file(path)
+        magic, version, _ = meta_file.HEADER_V1.unpack_from(buf, 0)
+        assert magic == meta_file.META_FILE_MAGIC
+        assert version == meta_file.META_FILE_FORMAT_VERSION
+
+    def test_legacy(self):
+        self._remove(LEGACY_FILE)
+        blocks = [block_meta(DATAIN, 1, 1024),
+                  block_meta(EMPTY, 0, 0),
+                  block_meta(DATAIN, 2, 100),
+                  block_meta(EMPTY, 0, 0)]
+        self.fs.write(meta_file.make_meta_path(LEGACY_FILE), 0,
+                      pickle.dumps(blocks))
+
+        # trailing empty blocks are trimmed
+        expected = [(DATAIN, 1, 1024), (EMPTY, 0, 0), (DATAIN, 2, 100)]
+        meta = meta_file(self.fs, LEGACY_FILE)
+        assert self._blocks(meta) == expected
+        assert meta.get_data_file_size() == 1124
+        assert not meta.is_clean()
+
+        meta.sync()
+        self._check_current_format(LEGACY_FILE)
+        meta = meta_file(self.fs, LEGACY_FILE)
+        assert self._blocks(meta) == expected
+        assert meta.get_data_file_size() == 1124
+        meta.clear()
+
+    def test_v1(self):
+        self._remove(V1_FILE)
+        buf = meta_file.HEADER_V1.pack(meta_file.META_FILE_MAGIC, 1, 0)
+        buf += meta_file.RECORD.pack(DATAIN, 3, 1024)
+        buf += meta_file.RECORD.pack(DATAIN, 4, 10)
+        self.fs.write(meta_file.make_meta_path(V1_FILE), 0, buf)
+
+        expected = [(DATAIN, 3, 1024), (DATAIN, 4, 10)]
+        meta = meta_file(self.fs, V1_FILE)
+        assert self._blocks(meta) == expected
+        # version 1 has no clean flag
+        assert not meta.is_clean()
+
+        # a change rewrites the whole file in the current format
+        meta.write_block_meta(2, block_meta(DATAIN, 5, 7))
+        self._check_current_format(V1_FILE)
+        meta = meta_file(self.fs, V1_FILE)
+        assert self._blocks(meta) == expected + [(DATAIN, 5, 7)]
+        assert meta.get_data_file_size() == 1041
+        meta.clear()
+
+    def test_torn_record(self):
+        self._remove(TORN_FILE)
+        meta = meta_file(self.fs, TORN_FILE)
+        for i in xrange(0, 3):
+            meta.write_block_meta(i, block_meta(DATAIN, 1, 1024), False)
+        meta.set_clean(True, False)
+        meta.sync()
+
+        # cut the last record short, as an interrupted write does
+        meta_path = meta_file.make_meta_path(TORN_FILE)
+        st = self.fs.stat(meta_path)
+        self.fs.truncate(meta_path, st.size - 3)
+
+        meta = meta_file(self.fs, TORN_FILE)
+        assert self._blocks(meta) == [(DATAIN, 1, 1024)] * 2
+        assert meta.get_data_file_size() == 2048
+        assert meta.is_clean()
+
+        # the record is written in place again
+        meta.write_block_meta(2, block_meta(DATAIN, 2, 512))
+        meta = meta_file(self.fs, TORN_FILE)
+        assert self._blocks(meta) == \
+            [(DATAIN, 1, 1024)] * 2 + [(DATAIN, 2, 512)]
+        meta.clear()
+
+    def start(self):
+        print "Meta file in the legacy pickle format"
+        self.test_legacy()
+
+        print "Meta file in format version 1"
+        self.test_v1()
+
+        print "Meta file with a torn last record"
+        self.test_torn_record()
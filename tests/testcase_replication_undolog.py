@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+
+"""
+   Copyright 2016 The Trustees of University of Arizona
+
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+
+       http://www.apache.org/licenses/LICENSE-2.0
+
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+
+import pickle
+
+from sgfsdriver.lib.replication import undo_log
+from sgfsdriver.lib.replication import undo_block_log
+from sgfsdriver.lib.replication import undo_size_log
+
+LEGACY_FILE = "/UNDO_LOG_LEGACY_FILE"
+V1_FILE = "/UNDO_LOG_V1_FILE"
+TORN_FILE = "/UNDO_LOG_TORN_FILE"
+RAW_FILE = "/UNDO_LOG_RAW_FILE"
+RAW_NEW_FILE = "/UNDO_LOG_RAW_NEW_FILE"
+
+
+class replication_test_impl():
+    def __init__(self, driver):
+        if not driver:
+            raise ValueError("driver is not given correctly")
+
+        self.driver = driver
+        self.fs = driver.fs
+
+    def _read_log_file(self, path):
+        log_path = undo_log.make_log_path(path)
+        st = self.fs.stat(log_path)
+        return self.fs.read(log_path, 0, st.size)
+
+    def _remove(self, path):
+        for p in [path, undo_log.make_log_path(path)]:
+            if self.fs.exists(p):
+                self.fs.unlink(p)
+
+    def _block_logs(self, ulog):
+        return [(log.id, log.version, log.size, log.data)
+                for log in ulog.read_block_logs()]
+
+    def _event_sizes(self, ulog):
+        return [log.size for log in ulog.read_event_logs()]
+
+    def test_legacy(self):
+        self._remove(LEGACY_FILE)
+        b_logs = [undo_block_log(1, "abc", 3, 3),
+                  undo_block_log(2, None, 1, 0)]
+        e_logs = [undo_size_log(10)]
+        self.fs.write(undo_log.make_log_path(LEGACY_FILE), 0,
+                      pickle.dumps((b_logs, e_logs)))
+
+        ulog = undo_log(self.fs, LEGACY_FILE)
+        assert self._block_logs(ulog) == \
+            [(1, 3, 3, "abc"), (2, 1, 0, None)]
+        assert self._event_sizes(ulog) == [10]
+
+        # appending rewrites the whole log in the binary format
+        ulog.write_block_log(undo_block_log(5, "x" * 100, 1, 100))
+        assert self._read_log_file(LEGACY_FILE).startswith(
+            undo_log.UNDO_LOG_MAGIC)
+
+        ulog = undo_log(self.fs, LEGACY_FILE)
+        assert self._block_logs(ulog) == \
+            [(1, 3, 3, "abc"), (2, 1, 0, None), (5, 1, 100, "x" * 100)]
+        assert self._event_sizes(ulog) == [10]
+        ulog.clear()
+
+    def test_v1(self):
+        self._remove(V1_FILE)
+        buf = undo_log.HEADER.pack(undo_log.UNDO_LOG_MAGIC, 1)
+        buf += undo_log._make_record(
+            undo_log.RECORD_TYPE_SIZE, 0, 0, 20, None)
+        buf += undo_log._make_record(
+            undo_log.RECORD_TYPE_BLOCK, 4, 2, 5, "hello")
+        self.fs.write(undo_log.make_log_path(V1_FILE), 0, buf)
+
+        ulog = undo_log(self.fs, V1_FILE)
+        assert self._block_logs(ulog) == [(4, 2, 5, "hello")]
+        assert self._event_sizes(ulog) == [20]
+
+        # records are appended to a version 1 log as is
+        ulog.write_block_log(undo_block_log(6, "bye", 1, 3))
+        ulog = undo_log(self.fs, V1_FILE)
+        assert self._block_logs(ulog) == [(4, 2, 5, "hello"),
+                                         (6, 1, 3, "bye")]
+        ulog.clear()
+
+    def test_torn_record(self):
+        self._remove(TORN_FILE)
+        ulog = undo_log(self.fs, TORN_FILE)
+        ulog.write_event_log(undo_size_log(30), False)
+        for i in xrange(0, 3):
+            ulog.write_block_log(
+                undo_block_log(i, chr(ord("a") + i) * 8, 1, 8), False)
+        ulog.sync()
+
+        # cut the last record short, as an interrupted append does
+        log_path = undo_log.make_log_path(TORN_FILE)
+        st = self.fs.stat(log_path)
+        self.fs.truncate(log_path, st.size - 5)
+
+        ulog = undo_log(self.fs, TORN_FILE)
+        assert self._block_logs(ulog) == [(0, 1, 8, "a" * 8),
+                                         (1, 1, 8, "b" * 8)]
+        assert self._event_sizes(ulog) == [30]
+
+        # the next record replaces the torn one
+        ulog.write_block_log(undo_block_log(7, "z" * 8, 1, 8))
+        ulog = undo_log(self.fs, TORN_FILE)
+        assert self._block_logs(ulog) == [(0, 1, 8, "a" * 8),
+                                         (1, 1, 8, "b" * 8),
+                                         (7, 1, 8, "z" * 8)]
+        ulog.clear()
+
+    def _crash_raw_copy(self, path, ulog):
+        # fail the writes of record headers after the backend copy
+        log_path = undo_log.make_log_path(path)
+        fs_write = self.fs.write
+
+        def failing_write(filepath, offset, buf):
+            if filepath == log_path and offset > 0:
+                raise IOError("crash")
+            return fs_write(filepath, offset, buf)
+
+        self.fs.write = failing_write
+        try:
+            ulog.write_block_log(
+                undo_block_log(3, None, 2, 16, source=(path, 0)))
+            assert False, "the crash was not injected"
+        except IOError:
+            pass
+        finally:
+            del self.fs.write
+
+    def test_raw_crash(self):
+        if not self.fs.has_native_copy_range():
+            print "skip raw records - no native copy in the plugin"
+            return
+
+        # a log with records before the raw one
+        self._remove(RAW_FILE)
+        self.fs.write(RAW_FILE, 0, "r" * 16)
+        ulog = undo_log(self.fs, RAW_FILE)
+        ulog.write_event_log(undo_size_log(16), False)
+        ulog.write_block_log(undo_block_log(0, "o" * 8, 1, 8))
+        self._crash_raw_copy(RAW_FILE, ulog)
+
+        ulog = undo_log(self.fs, RAW_FILE)
+        assert self._block_logs(ulog) == [(0, 1, 8, "o" * 8)]
+        assert self._event_sizes(ulog) == [16]
+
+        # a raw record completes when the header is written
+        ulog.write_block_log(
+            undo_block_log(3, None, 2, 16, source=(RAW_FILE, 0)))
+        ulog = undo_log(self.fs, RAW_FILE)
+        assert self._block_logs(ulog) == [(0, 1, 8, "o" * 8),
+                                         (3, 2, 16, "r" * 16)]
+        ulog.clear()
+        self._remove(RAW_FILE)
+
+        # a raw record first in a new log
+        self._remove(RAW_NEW_FILE)
+        self.fs.write(RAW_NEW_FILE, 0, "n" * 16)
+        ulog = undo_log(self.fs, RAW_NEW_FILE)
+        self._crash_raw_copy(RAW_NEW_FILE, ulog)
+
+        ulog = undo_log(self.fs, RAW_NEW_FILE)
+        assert self._block_logs(ulog) == []
+        ulog.clear()
+        self._remove(RAW_NEW_FILE)
+
+    def start(self):
+        print "Undo log in the legacy pickle format"
+        self.test_legacy()
+
+        print "Undo log in format version 1"
+        self.test_v1()
+
+        print "Undo log with a torn last record"
+        self.test_torn_record()
+
+        print "Undo log with a crash between a raw copy and its header"
+        self.test_raw_crash()